@@ -0,0 +1,89 @@
+"""
+AgentBuy - Request Batcher
+
+Coalesces calls that arrive within a few milliseconds of each other into a
+single batch call, so a burst of N requests costs one LLM round-trip instead
+of N.
+"""
+import asyncio
+import logging
+from collections.abc import Hashable
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RequestBatcher:
+    """
+    Collects items for a short window and hands them to a batch function.
+    
+    The batch function takes a list of items and must return one result per
+    item, in order. A batch is flushed when the window closes or it reaches
+    max_batch items, whichever comes first. Items submitted under different
+    keys are never batched together.
+    """
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[list], Awaitable[list]],
+        window: float = 0.02,
+        max_batch: int = 16
+    ):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        # Pending items and their flush timers, by key
+        self._pending: dict[Hashable, list[tuple[Any, asyncio.Future]]] = {}
+        self._timers: dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+    
+    async def submit(self, item: Any, key: Hashable = None) -> Any:
+        """
+        Queue an item for the next batch.
+        
+        Args:
+            item: One input for the batch function
+            key: Only items with the same key share a batch, e.g. a user ID
+            
+        Returns:
+            The batch function's result for this item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+        
+        if len(pending) >= self.max_batch:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        
+        return await future
+    
+    def _flush(self, key: Hashable):
+        """Send everything pending under key as one batch."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
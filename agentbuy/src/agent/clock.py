@@ -0,0 +1,32 @@
+"""
+AgentBuy - Minute Clock
+
+Wall-clock strings at minute resolution, formatted once per minute instead
+of on every call. Minute-stable timestamps also keep prompts byte-identical
+(and cacheable) for the whole minute.
+"""
+import time
+from datetime import datetime
+
+
+_cache: dict[str, tuple[int, str]] = {}
+
+
+def minute_clock(fmt: str = "%I:%M %p, %A") -> str:
+    """
+    Get the current local time formatted with fmt, cached per minute.
+
+    Args:
+        fmt: strftime format (should not include seconds)
+
+    Returns:
+        Formatted current time
+    """
+    minute = int(time.time() // 60)
+    cached = _cache.get(fmt)
+    if cached and cached[0] == minute:
+        return cached[1]
+
+    value = datetime.now().strftime(fmt)
+    _cache[fmt] = (minute, value)
+    return value
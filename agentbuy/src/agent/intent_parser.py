@@ -1,28 +1,76 @@
 """
 AgentBuy - Intent Parser
 
-Uses GPT-4 to extract structured purchase intent from natural language.
+Uses an OpenAI model with structured outputs to extract structured purchase intent from natural language.
 """
-import json
-from dataclasses import dataclass
-from typing import Optional
-from openai import AsyncOpenAI
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Literal, Optional
+import orjson
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
 
+from .llm import get_shared_client
 
-@dataclass
-class ParsedIntent:
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+class ParsedIntent(BaseModel):
     """Structured representation of a purchase intent."""
-    action: str  # "purchase", "cancel", "status", "find"
-    platform: str  # "starbucks", "doordash", "amazon"
-    items: list[dict]  # [{"name": "Iced Latte", "size": "grande", "quantity": 1}]
-    delivery: bool
+    action: str = "unknown"  # "purchase", "cancel", "status", "find"
+    platform: str = "unknown"  # "starbucks", "doordash", "amazon"
+    items: list[dict] = []  # [{"name": "Iced Latte", "size": "grande", "quantity": 1}]
+    delivery: bool = False
     location: Optional[str] = None
     time_preference: Optional[str] = None  # "now", "in 30 minutes", "for 3pm"
     special_instructions: Optional[str] = None
     raw_text: str = ""
     confidence: float = 0.0
+    
+    @field_validator("items")
+    @classmethod
+    def _drop_null_fields(cls, items: list[dict]) -> list[dict]:
+        # Strict schemas send unset fields as null; connectors expect them absent
+        return [{k: v for k, v in item.items() if v is not None} for item in items]
+
+
+class IntentItemSchema(BaseModel):
+    """One requested item, as returned by the model."""
+    model_config = ConfigDict(extra="forbid")
+    
+    name: str
+    size: Optional[str]
+    quantity: int
+    customizations: list[str]
+
 
+class IntentSchema(BaseModel):
+    """Strict JSON schema the model must answer with (OpenAI structured outputs)."""
+    model_config = ConfigDict(extra="forbid")
+    
+    action: Literal["purchase", "cancel", "status", "find", "unknown"]
+    platform: str
+    items: list[IntentItemSchema]
+    delivery: bool
+    location: Optional[str]
+    time_preference: Optional[str]
+    special_instructions: Optional[str]
+    confidence: float
+
+
+INTENT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "parsed_intent",
+        "strict": True,
+        "schema": IntentSchema.model_json_schema()
+    }
+}
 
+
+# Kept fully static so it is a cacheable prompt prefix; per-call data belongs
+# in the user message.
 SYSTEM_PROMPT = """You are an intent parser for a purchase agent. Extract structured information from user commands.
 
 Output JSON with these fields:
@@ -45,41 +93,119 @@ Examples:
 class IntentParser:
     """Parses natural language into structured purchase intents."""
     
-    def __init__(self, openai_client: AsyncOpenAI):
-        self.client = openai_client
+    MODEL = "gpt-4o-mini"
+    CACHE_SIZE = 512
     
-    async def parse(self, text: str) -> ParsedIntent:
-        """Parse user text into a structured intent."""
-        response = await self.client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
+    def __init__(self, openai_client: "AsyncOpenAI" = None):
+        self.client = openai_client or get_shared_client()
+        self._parse_cache: OrderedDict[bytes, ParsedIntent] = OrderedDict()
+    
+    def _cache_key(self, text: str) -> bytes:
+        """Content hash of everything that determines the parse result."""
+        return hashlib.blake2b(
+            "\0".join((self.MODEL, SYSTEM_PROMPT, text)).encode(),
+            digest_size=16
+        ).digest()
+    
+    def _request_body(self, text: str) -> dict:
+        """Chat completion parameters for parsing a single command."""
+        return {
+            "model": self.MODEL,
+            "messages": [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": text}
             ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            max_tokens=500
-        )
+            "response_format": INTENT_RESPONSE_FORMAT,
+            "temperature": 0.1,
+            "max_tokens": 200
+        }
+    
+    def _to_intent(self, content: Optional[str], text: str) -> ParsedIntent:
+        """Build a ParsedIntent from the model's schema-conforming output."""
+        if content is None:
+            # Refusal, or a request that failed inside a batch
+            return ParsedIntent(raw_text=text)
         
         try:
-            data = json.loads(response.choices[0].message.content)
-            return ParsedIntent(
-                action=data.get("action", "unknown"),
-                platform=data.get("platform", "unknown"),
-                items=data.get("items", []),
-                delivery=data.get("delivery", False),
-                location=data.get("location"),
-                time_preference=data.get("time_preference"),
-                special_instructions=data.get("special_instructions"),
-                raw_text=text,
-                confidence=data.get("confidence", 0.5)
-            )
-        except (json.JSONDecodeError, KeyError) as e:
-            return ParsedIntent(
-                action="unknown",
-                platform="unknown",
-                items=[],
-                delivery=False,
-                raw_text=text,
-                confidence=0.0
-            )
+            return ParsedIntent.model_validate(orjson.loads(content) | {"raw_text": text})
+        except (orjson.JSONDecodeError, ValidationError):
+            # Only reachable if the output was cut off at max_tokens
+            return ParsedIntent(raw_text=text)
+    
+    async def parse(self, text: str) -> ParsedIntent:
+        """Parse user text into a structured intent (LRU-cached by content when recognized)."""
+        key = self._cache_key(text)
+        cached = self._parse_cache.get(key)
+        if cached is not None:
+            self._parse_cache.move_to_end(key)
+            return cached.model_copy(deep=True)
+        
+        response = await self.client.chat.completions.create(**self._request_body(text))
+        intent = self._to_intent(response.choices[0].message.content, text)
+        
+        # Fallbacks from refused or cut-off output are "unknown" too; none of
+        # them are cached, so asking again gets a fresh parse
+        if intent.action != "unknown":
+            self._parse_cache[key] = intent
+            if len(self._parse_cache) > self.CACHE_SIZE:
+                self._parse_cache.popitem(last=False)
+        return intent.model_copy(deep=True)
+    
+    async def parse_batch(
+        self,
+        texts: list[str],
+        poll_interval: float = 30.0
+    ) -> list[ParsedIntent]:
+        """
+        Parse many commands through the OpenAI Batch API.
+        
+        Intended for offline work (log replay, labelling) where latency doesn't
+        matter; live and voice paths should keep using parse().
+        
+        Args:
+            texts: Commands to parse
+            poll_interval: Seconds between batch status checks
+            
+        Returns:
+            Parsed intents in the same order as texts
+        """
+        if not texts:
+            return []
+        
+        lines = [
+            orjson.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._request_body(text)
+            })
+            for i, text in enumerate(texts)
+        ]
+        batch_file = await self.client.files.create(
+            file=("intents.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+        
+        contents: dict[int, Optional[str]] = {}
+        if batch.status == "completed" and batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                result = orjson.loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                    contents[int(result["custom_id"])] = content
+        
+        # Requests that failed inside the batch come back as "unknown" intents
+        return [self._to_intent(contents.get(i), text) for i, text in enumerate(texts)]
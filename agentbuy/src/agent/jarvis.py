@@ -6,20 +6,34 @@ Combines personality, memory, and real-time payments.
 """
 import asyncio
 import logging
-import os
+import time
+from collections import deque
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from openai import AsyncOpenAI
+import orjson
 
+from src.agent.clock import minute_clock
+from src.agent.llm import get_shared_client
+from src.agent.runner import run
 from src.tools.payments import StripePaymentTools
 from src.tools.auth import AgentAuthTools
 from src.memory.memory import MemorySystem
+from src.voice.realtime import RealtimeTranscriber
+from src.voice.whisper import transcribe
 
 logger = logging.getLogger(__name__)
 
+# How long a rendered system prompt is reused across turns
+SYSTEM_PROMPT_TTL_SECONDS = 60.0
 
-JARVIS_SYSTEM_PROMPT = """You are JARVIS, an AI assistant for voice-powered purchases and daily tasks.
+# Only the tail of the conversation is ever sent to the model
+HISTORY_MAXLEN = 32
+
+
+# The static instructions come first so every request shares the same prompt
+# prefix (and hits OpenAI's prompt cache); only the short context block varies.
+JARVIS_STATIC_PREFIX = """You are JARVIS, an AI assistant for voice-powered purchases and daily tasks.
 
 ## Your Personality
 - Polite, efficient, and slightly formal but warm
@@ -54,14 +68,22 @@ JARVIS: "You've spent $35 today with $15 remaining in your daily limit."
 User: "That's too expensive"
 JARVIS: "I understand. That exceeds your daily limit. Would you like me to find a more affordable alternative, or shall I request an override?"
 
-## Current Context
+"""
+
+JARVIS_DYNAMIC_SUFFIX = """## Current Context
 Time: {current_time}
 User: {user_id}
 Recent activity: {recent_activity}
 """
 
+JARVIS_SYSTEM_PROMPT = JARVIS_STATIC_PREFIX + JARVIS_DYNAMIC_SUFFIX
 
-JARVIS_TOOLS = [
+# Sent as its own system message so the static part is never re-concatenated
+_STATIC_SYSTEM_MESSAGE = {"role": "system", "content": JARVIS_STATIC_PREFIX}
+
+
+# Immutable and module-level: the same schema object is handed to every request
+JARVIS_TOOLS = (
     {
         "type": "function",
         "function": {
@@ -136,7 +158,7 @@ JARVIS_TOOLS = [
             }
         }
     }
-]
+)
 
 
 class JarvisAssistant:
@@ -155,9 +177,8 @@ class JarvisAssistant:
         openai_api_key: str = None,
         user_id: str = "default_user"
     ):
-        # Initialize OpenAI
-        api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-        self.llm = AsyncOpenAI(api_key=api_key) if api_key else None
+        # Initialize OpenAI (shared connection pool)
+        self.llm = get_shared_client(openai_api_key)
         
         # Initialize tools
         self.payments = StripePaymentTools()
@@ -166,7 +187,17 @@ class JarvisAssistant:
         
         # User context
         self.user_id = user_id
-        self.conversation_history = []
+        self.conversation_history: deque[dict] = deque(maxlen=HISTORY_MAXLEN)
+        self._system_prompt_cache: Optional[tuple[float, list[dict]]] = None
+        self._recent_activity_cache: Optional[tuple[int, str]] = None
+        
+        # Tool name -> handler for JARVIS_TOOLS function calls
+        self._tool_dispatch = {
+            "process_payment": self._tool_process_payment,
+            "check_budget": self._tool_check_budget,
+            "get_user_preferences": self._tool_get_preferences,
+            "place_usual_order": self._tool_place_usual_order,
+        }
         
         # Set default preferences
         self._setup_default_preferences()
@@ -180,80 +211,103 @@ class JarvisAssistant:
         })
         self.memory.set_semantic(self.user_id, "name", "User")
     
-    def _get_system_prompt(self) -> str:
-        """Build the system prompt with current context."""
-        # Get recent activity
-        recent = self.memory.search_episodic("order", limit=3)
-        recent_str = ", ".join([m.content[:50] for m in recent]) if recent else "No recent activity"
+    def _get_system_messages(self) -> list[dict]:
+        """Build the system messages: static instructions, then current context."""
+        if self._system_prompt_cache:
+            cached_at, messages = self._system_prompt_cache
+            if time.monotonic() - cached_at < SYSTEM_PROMPT_TTL_SECONDS:
+                return messages
         
-        return JARVIS_SYSTEM_PROMPT.format(
-            current_time=datetime.now().strftime("%I:%M %p, %A"),
+        # Get recent activity - only re-searched when episodic memory has changed
+        episodic_version = self.memory.episodic_version
+        if self._recent_activity_cache and self._recent_activity_cache[0] == episodic_version:
+            recent_str = self._recent_activity_cache[1]
+        else:
+            recent = self.memory.search_episodic("order", limit=3)
+            recent_str = ", ".join(m.content[:50] for m in recent) or "No recent activity"
+            self._recent_activity_cache = (episodic_version, recent_str)
+        
+        context = JARVIS_DYNAMIC_SUFFIX.format(
+            current_time=minute_clock(),
             user_id=self.user_id,
             recent_activity=recent_str
         )
+        messages = [_STATIC_SYSTEM_MESSAGE, {"role": "system", "content": context}]
+        self._system_prompt_cache = (time.monotonic(), messages)
+        return messages
+    
+    async def _execute_tool_call(self, call: dict) -> str:
+        """Decode a streamed tool call's arguments and execute it."""
+        args = orjson.loads(call["function"]["arguments"] or "{}")
+        return await self._execute_function(call["function"]["name"], args)
     
     async def _execute_function(self, name: str, args: dict) -> str:
         """Execute a tool function and return result."""
         logger.info(f"JARVIS executing: {name}({args})")
         
-        if name == "process_payment":
-            # AgentAuth + Stripe payment
-            auth_result = await self.auth.request_authorization(
-                user_id=self.user_id,
-                amount=args["amount"],
-                merchant=args["merchant"],
-                description=args.get("description", f"Payment to {args['merchant']}"),
-                category="general"
-            )
-            
-            if not auth_result.get("allowed"):
-                return f"Payment denied: {auth_result.get('reason', 'Over budget')}"
-            
-            payment_result = await self.payments.process_payment(
-                amount=args["amount"],
-                merchant_name=args["merchant"],
-                description=args.get("description"),
-                authorization_code=auth_result.get("authorization_code")
-            )
-            
-            if payment_result.get("success"):
-                # Remember this order
-                self.memory.remember_order(self.user_id, {
-                    "merchant": args["merchant"],
-                    "amount": args["amount"],
-                    "time": datetime.now().isoformat()
-                })
-                return f"Payment successful. ${args['amount']:.2f} to {args['merchant']}. Payment ID: {payment_result.get('payment_id')}"
-            else:
-                return f"Payment failed: {payment_result.get('error')}"
+        handler = self._tool_dispatch.get(name)
+        if handler is None:
+            return f"Unknown function: {name}"
+        return await handler(args)
+    
+    async def _tool_process_payment(self, args: dict) -> str:
+        # AgentAuth + Stripe payment
+        auth_result = await self.auth.request_authorization(
+            user_id=self.user_id,
+            amount=args["amount"],
+            merchant=args["merchant"],
+            description=args.get("description", f"Payment to {args['merchant']}"),
+            category="general"
+        )
         
-        elif name == "check_budget":
-            category = args.get("category", "general")
-            budget = await self.auth.check_budget(self.user_id, category)
-            return f"Budget for {category}: ${budget.get('remaining', 50):.2f} remaining of ${budget.get('budget_limit', 50):.2f}"
+        if not auth_result.get("allowed"):
+            return f"Payment denied: {auth_result.get('reason', 'Over budget')}"
         
-        elif name == "get_user_preferences":
-            category = args.get("category", "general")
-            prefs = self.memory.get_semantic(self.user_id, category)
-            if prefs:
-                return f"Preferences for {category}: {prefs}"
-            return f"No saved preferences for {category}"
+        payment_result = await self.payments.process_payment(
+            amount=args["amount"],
+            merchant_name=args["merchant"],
+            description=args.get("description"),
+            authorization_code=auth_result.get("authorization_code")
+        )
         
-        elif name == "place_usual_order":
-            category = args.get("category", "coffee")
-            prefs = self.memory.get_semantic(self.user_id, category)
-            
-            if not prefs:
-                return f"I don't have a usual order saved for {category}"
-            
-            # Execute the usual order
-            return await self._execute_function("process_payment", {
-                "amount": prefs.get("price", 10),
-                "merchant": prefs.get("preferred_store", category.title()),
-                "description": prefs.get("usual_order", f"Usual {category} order")
+        if payment_result.get("success"):
+            # Remember this order
+            self.memory.remember_order(self.user_id, {
+                "merchant": args["merchant"],
+                "amount": args["amount"],
+                "time": datetime.now().isoformat()
             })
+            # Recent activity changed - re-render the prompt next turn
+            self._system_prompt_cache = None
+            return f"Payment successful. ${args['amount']:.2f} to {args['merchant']}. Payment ID: {payment_result.get('payment_id')}"
+        else:
+            return f"Payment failed: {payment_result.get('error')}"
+    
+    async def _tool_check_budget(self, args: dict) -> str:
+        category = args.get("category", "general")
+        budget = await self.auth.check_budget(self.user_id, category)
+        return f"Budget for {category}: ${budget.get('remaining', 50):.2f} remaining of ${budget.get('budget_limit', 50):.2f}"
+    
+    async def _tool_get_preferences(self, args: dict) -> str:
+        category = args.get("category", "general")
+        prefs = self.memory.get_semantic(self.user_id, category)
+        if prefs:
+            return f"Preferences for {category}: {prefs}"
+        return f"No saved preferences for {category}"
+    
+    async def _tool_place_usual_order(self, args: dict) -> str:
+        category = args.get("category", "coffee")
+        prefs = self.memory.get_semantic(self.user_id, category)
         
-        return f"Unknown function: {name}"
+        if not prefs:
+            return f"I don't have a usual order saved for {category}"
+        
+        # Execute the usual order
+        return await self._tool_process_payment({
+            "amount": prefs.get("price", 10),
+            "merchant": prefs.get("preferred_store", category.title()),
+            "description": prefs.get("usual_order", f"Usual {category} order")
+        })
     
     async def chat(self, user_message: str) -> str:
         """
@@ -265,8 +319,24 @@ class JarvisAssistant:
         Returns:
             JARVIS's response text
         """
+        return "".join([chunk async for chunk in self.chat_stream(user_message)])
+    
+    async def chat_stream(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Process a user message and stream JARVIS's response as it is generated.
+        
+        Lets TTS start speaking on the first tokens instead of waiting for
+        the full completion.
+        
+        Args:
+            user_message: The user's text (or transcribed voice)
+            
+        Yields:
+            Chunks of JARVIS's response text
+        """
         if not self.llm:
-            return "I apologize, but I'm not fully initialized. Please check the OpenAI API key."
+            yield "I apologize, but I'm not fully initialized. Please check the OpenAI API key."
+            return
         
         # Add to conversation history
         self.conversation_history.append({
@@ -274,36 +344,62 @@ class JarvisAssistant:
             "content": user_message
         })
         
-        # Build messages with system prompt
-        messages = [
-            {"role": "system", "content": self._get_system_prompt()}
-        ] + self.conversation_history[-10:]  # Keep last 10 messages
+        # Build messages with system prompt (rendered once per turn)
+        system_messages = self._get_system_messages()
+        messages = system_messages + list(self.conversation_history)[-10:]  # Keep last 10 messages
         
         try:
             # First call - may include tool calls
-            response = await self.llm.chat.completions.create(
+            stream = await self.llm.chat.completions.create(
                 model="gpt-4o",
                 messages=messages,
                 tools=JARVIS_TOOLS,
                 tool_choice="auto",
-                temperature=0.7
+                temperature=0.7,
+                stream=True
             )
             
-            assistant_message = response.choices[0].message
+            content_parts = []
+            tool_calls: dict[int, dict] = {}  # Tool call deltas, by index
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield delta.content
+                for tc in delta.tool_calls or []:
+                    call = tool_calls.setdefault(tc.index, {
+                        "id": "",
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        call["function"]["name"] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["function"]["arguments"] += tc.function.arguments
+            
+            content = "".join(content_parts) or None
             
             # Check for tool calls
-            if assistant_message.tool_calls:
-                # Execute each tool call
+            if tool_calls:
+                calls = [tool_calls[i] for i in sorted(tool_calls)]
+                
+                # Execute the tool calls concurrently - they are independent
+                results = await asyncio.gather(
+                    *(self._execute_tool_call(call) for call in calls),
+                    return_exceptions=True
+                )
+                
                 tool_results = []
-                for tool_call in assistant_message.tool_calls:
-                    import json
-                    args = json.loads(tool_call.function.arguments)
-                    result = await self._execute_function(
-                        tool_call.function.name,
-                        args
-                    )
+                for call, result in zip(calls, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Tool {call['function']['name']} failed: {result}")
+                        result = f"Error: {result}"
                     tool_results.append({
-                        "tool_call_id": tool_call.id,
+                        "tool_call_id": call["id"],
                         "role": "tool",
                         "content": result
                     })
@@ -311,54 +407,44 @@ class JarvisAssistant:
                 # Add assistant message and tool results to history
                 self.conversation_history.append({
                     "role": "assistant",
-                    "content": assistant_message.content,
-                    "tool_calls": [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {
-                                "name": tc.function.name,
-                                "arguments": tc.function.arguments
-                            }
-                        }
-                        for tc in assistant_message.tool_calls
-                    ]
+                    "content": content,
+                    "tool_calls": calls
                 })
                 
                 for tr in tool_results:
                     self.conversation_history.append(tr)
                 
                 # Get final response after tool execution
-                messages = [
-                    {"role": "system", "content": self._get_system_prompt()}
-                ] + self.conversation_history[-15:]
+                messages = system_messages + list(self.conversation_history)[-15:]
                 
-                final_response = await self.llm.chat.completions.create(
+                final_stream = await self.llm.chat.completions.create(
                     model="gpt-4o",
                     messages=messages,
-                    temperature=0.7
+                    temperature=0.7,
+                    stream=True
                 )
                 
-                final_text = final_response.choices[0].message.content
+                final_parts = []
+                async for chunk in final_stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        final_parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                
                 self.conversation_history.append({
                     "role": "assistant",
-                    "content": final_text
+                    "content": "".join(final_parts)
                 })
-                
-                return final_text
             
             else:
-                # No tool calls, just return the response
-                response_text = assistant_message.content
+                # No tool calls, the response has already been streamed
                 self.conversation_history.append({
                     "role": "assistant",
-                    "content": response_text
+                    "content": content
                 })
-                return response_text
         
         except Exception as e:
             logger.error(f"JARVIS error: {e}")
-            return f"I apologize, I encountered an error: {str(e)}"
+            yield f"I apologize, I encountered an error: {str(e)}"
     
     async def transcribe_and_chat(self, audio_bytes: bytes) -> str:
         """
@@ -373,29 +459,44 @@ class JarvisAssistant:
         if not self.llm:
             return "Voice processing unavailable."
         
-        # Transcribe with Whisper
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as f:
-            f.write(audio_bytes)
-            temp_path = f.name
+        # Transcribe with Whisper - one multipart upload, no temp file
+        user_text = await transcribe(
+            audio_bytes,
+            api_key=self.llm.api_key,
+            base_url=str(self.llm.base_url)
+        )
         
-        try:
-            with open(temp_path, "rb") as audio_file:
-                transcript = await self.llm.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-            
-            user_text = transcript.text
-            logger.info(f"Transcribed: {user_text}")
+        return await self.chat(user_text)
+    
+    async def start_realtime_session(self) -> RealtimeTranscriber:
+        """
+        Open a persistent realtime transcription session.
+        
+        Feed it audio with session.send_audio() and pass it to converse().
+        
+        Returns:
+            A connected RealtimeTranscriber
+        """
+        session = RealtimeTranscriber(api_key=self.llm.api_key if self.llm else None)
+        await session.connect()
+        return session
+    
+    async def converse(self, session: RealtimeTranscriber) -> AsyncIterator[str]:
+        """
+        Respond to every utterance transcribed by a realtime session.
+        
+        Args:
+            session: Session from start_realtime_session()
             
-            return await self.chat(user_text)
-        finally:
-            os.unlink(temp_path)
+        Yields:
+            JARVIS's response to each utterance
+        """
+        async for user_text in session.transcripts():
+            yield await self.chat(user_text)
     
     def reset_conversation(self):
         """Clear conversation history."""
-        self.conversation_history = []
+        self.conversation_history.clear()
 
 
 async def demo():
@@ -430,4 +531,4 @@ async def demo():
 
 
 if __name__ == "__main__":
-    asyncio.run(demo())
+    run(demo())
@@ -5,12 +5,56 @@ Demonstrates JARVIS interactions without requiring OpenAI API.
 Uses pre-scripted responses for demo purposes.
 """
 import asyncio
-from datetime import datetime
+import re
+from typing import Optional
+from src.agent.clock import minute_clock
+from src.agent.runner import run
 from src.tools.payments import StripePaymentTools
 from src.tools.auth import AgentAuthTools
 import os
 
 
+# Every routing keyword, matched in a single scan of the input. The lookahead
+# lets overlapping keywords ("pay" / "payment") all be reported.
+_KEYWORDS = [
+    "morning", "hello", "hey", "hi",
+    "usual", "coffee", "order", "yes please",
+    "payment", "pay", "$",
+    "budget", "spending", "limit",
+    "thank",
+]
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(k) for k in sorted(_KEYWORDS, key=len, reverse=True)) + "))"
+)
+_AMOUNT_RE = re.compile(r'\$?(\d+(?:\.\d{2})?)')
+_MERCHANTS = ["netflix", "spotify", "notion", "doordash", "amazon", "uber"]
+
+
+_GREETING_WORDS = frozenset({"morning", "hello", "hi", "hey"})
+_PAYMENT_WORDS = frozenset({"pay", "payment", "$"})
+_BUDGET_WORDS = frozenset({"budget", "spending", "limit"})
+
+
+def _is_greeting(found: set) -> bool:
+    return not _GREETING_WORDS.isdisjoint(found)
+
+
+def _is_usual_order(found: set) -> bool:
+    return "usual" in found or ("coffee" in found and "order" in found) or "yes please" in found
+
+
+def _is_payment(found: set) -> bool:
+    return not _PAYMENT_WORDS.isdisjoint(found)
+
+
+def _is_budget(found: set) -> bool:
+    return not _BUDGET_WORDS.isdisjoint(found)
+
+
+def _is_thanks(found: set) -> bool:
+    return "thank" in found
+
+
 class JarvisDemo:
     """Simulated JARVIS for demo when OpenAI is unavailable."""
     
@@ -25,126 +69,139 @@ class JarvisDemo:
     async def respond(self, user_input: str) -> dict:
         """Generate a JARVIS-style response with real payment execution."""
         text = user_input.lower()
+        found = {m.group(1) for m in _KEYWORD_RE.finditer(text)}
         
-        # Greeting
-        if any(word in text for word in ["morning", "hello", "hi", "hey"]):
-            hour = datetime.now().hour
-            if hour < 12:
-                greeting = "Good morning"
-            elif hour < 17:
-                greeting = "Good afternoon"
-            else:
-                greeting = "Good evening"
-            
-            return {
-                "response": f"{greeting}. I notice it's {datetime.now().strftime('%I:%M %p')}. "
-                           "Shall I order your usual coffee from Starbucks?",
-                "action": None
-            }
+        # First matching intent wins; a handler returning None falls through
+        for matches, handler in self._INTENTS:
+            if matches(found):
+                result = await handler(self, text)
+                if result is not None:
+                    return result
+        
+        return self._default()
+    
+    async def _handle_greeting(self, text: str) -> dict:
+        hour = int(minute_clock("%H"))
+        if hour < 12:
+            greeting = "Good morning"
+        elif hour < 17:
+            greeting = "Good afternoon"
+        else:
+            greeting = "Good evening"
+        
+        return {
+            "response": f"{greeting}. I notice it's {minute_clock('%I:%M %p')}. "
+                       "Shall I order your usual coffee from Starbucks?",
+            "action": None
+        }
+    
+    async def _handle_usual_order(self, text: str) -> dict:
+        # Execute real payment
+        auth = await self.auth.request_authorization(
+            user_id="demo_user",
+            amount=6.75,
+            merchant="Starbucks",
+            description="Grande oat milk latte",
+            category="coffee"
+        )
         
-        # Coffee/usual order
-        if "usual" in text or ("coffee" in text and "order" in text) or "yes please" in text:
-            # Execute real payment
-            auth = await self.auth.request_authorization(
-                user_id="demo_user",
+        if auth.get("allowed"):
+            payment = await self.payments.process_payment(
                 amount=6.75,
-                merchant="Starbucks",
-                description="Grande oat milk latte",
-                category="coffee"
+                merchant_name="Starbucks",
+                authorization_code=auth.get("authorization_code")
             )
             
-            if auth.get("allowed"):
-                payment = await self.payments.process_payment(
-                    amount=6.75,
-                    merchant_name="Starbucks",
-                    authorization_code=auth.get("authorization_code")
-                )
-                
-                if payment.get("success"):
-                    return {
-                        "response": f"Ordering one grande oat milk latte from Main Street Starbucks. "
-                                   f"That's $6.75. Payment authorized and processing. "
-                                   f"Your order will be ready in approximately 8 minutes.",
-                        "action": "payment",
-                        "payment_id": payment.get("payment_id"),
-                        "amount": 6.75
-                    }
-            
-            return {
-                "response": "I was unable to process the coffee order. It may exceed your budget.",
-                "action": "denied"
-            }
+            if payment.get("success"):
+                return {
+                    "response": f"Ordering one grande oat milk latte from Main Street Starbucks. "
+                               f"That's $6.75. Payment authorized and processing. "
+                               f"Your order will be ready in approximately 8 minutes.",
+                    "action": "payment",
+                    "payment_id": payment.get("payment_id"),
+                    "amount": 6.75
+                }
         
-        # Payment requests
-        if "pay" in text or "payment" in text or "$" in text:
-            import re
-            # Extract amount
-            amount_match = re.search(r'\$?(\d+(?:\.\d{2})?)', text)
-            amount = float(amount_match.group(1)) if amount_match else 10.0
-            
-            # Extract merchant
-            merchants = ["netflix", "spotify", "notion", "doordash", "amazon", "uber"]
-            merchant = "Unknown Service"
-            for m in merchants:
-                if m in text:
-                    merchant = m.title()
-                    break
-            
-            # Execute real payment
-            auth = await self.auth.request_authorization(
-                user_id="demo_user",
+        return {
+            "response": "I was unable to process the coffee order. It may exceed your budget.",
+            "action": "denied"
+        }
+    
+    async def _handle_payment(self, text: str) -> Optional[dict]:
+        # Extract amount
+        amount_match = _AMOUNT_RE.search(text)
+        amount = float(amount_match.group(1)) if amount_match else 10.0
+        
+        # Extract merchant
+        merchant = "Unknown Service"
+        for m in _MERCHANTS:
+            if m in text:
+                merchant = m.title()
+                break
+        
+        # Execute real payment
+        auth = await self.auth.request_authorization(
+            user_id="demo_user",
+            amount=amount,
+            merchant=merchant,
+            description=f"Payment to {merchant}",
+            category="saas"
+        )
+        
+        if auth.get("allowed"):
+            payment = await self.payments.process_payment(
                 amount=amount,
-                merchant=merchant,
-                description=f"Payment to {merchant}",
-                category="saas"
+                merchant_name=merchant,
+                authorization_code=auth.get("authorization_code")
             )
             
-            if auth.get("allowed"):
-                payment = await self.payments.process_payment(
-                    amount=amount,
-                    merchant_name=merchant,
-                    authorization_code=auth.get("authorization_code")
-                )
-                
-                if payment.get("success"):
-                    return {
-                        "response": f"Processing ${amount:.2f} payment to {merchant}... "
-                                   f"Done. Payment successful. Your {merchant} subscription is active.",
-                        "action": "payment",
-                        "payment_id": payment.get("payment_id"),
-                        "amount": amount,
-                        "merchant": merchant
-                    }
-            else:
+            if payment.get("success"):
                 return {
-                    "response": f"I'm afraid that payment of ${amount:.2f} exceeds your spending limit. "
-                               f"Would you like me to request an override, or find an alternative?",
-                    "action": "denied",
-                    "reason": auth.get("reason")
+                    "response": f"Processing ${amount:.2f} payment to {merchant}... "
+                               f"Done. Payment successful. Your {merchant} subscription is active.",
+                    "action": "payment",
+                    "payment_id": payment.get("payment_id"),
+                    "amount": amount,
+                    "merchant": merchant
                 }
+            return None
         
-        # Budget check
-        if "budget" in text or "spending" in text or "limit" in text:
-            budget = await self.auth.check_budget("demo_user", "general")
-            return {
-                "response": f"Your current spending: ${50 - budget.get('remaining', 50):.2f} today. "
-                           f"Remaining budget: ${budget.get('remaining', 50):.2f} of your ${budget.get('budget_limit', 50):.2f} daily limit.",
-                "action": "budget_check"
-            }
-        
-        # Thank you
-        if "thank" in text:
-            return {
-                "response": "You're most welcome. Is there anything else I can assist you with?",
-                "action": None
-            }
-        
-        # Default
+        return {
+            "response": f"I'm afraid that payment of ${amount:.2f} exceeds your spending limit. "
+                       f"Would you like me to request an override, or find an alternative?",
+            "action": "denied",
+            "reason": auth.get("reason")
+        }
+    
+    async def _handle_budget(self, text: str) -> dict:
+        budget = await self.auth.check_budget("demo_user", "general")
+        return {
+            "response": f"Your current spending: ${50 - budget.get('remaining', 50):.2f} today. "
+                       f"Remaining budget: ${budget.get('remaining', 50):.2f} of your ${budget.get('budget_limit', 50):.2f} daily limit.",
+            "action": "budget_check"
+        }
+    
+    async def _handle_thanks(self, text: str) -> dict:
+        return {
+            "response": "You're most welcome. Is there anything else I can assist you with?",
+            "action": None
+        }
+    
+    def _default(self) -> dict:
         return {
             "response": "I'm ready to help with payments, orders, or checking your spending. "
                        "Just let me know what you need.",
             "action": None
         }
+    
+    # Ordered (predicate, handler) routing table
+    _INTENTS = [
+        (_is_greeting, _handle_greeting),
+        (_is_usual_order, _handle_usual_order),
+        (_is_payment, _handle_payment),
+        (_is_budget, _handle_budget),
+        (_is_thanks, _handle_thanks),
+    ]
 
 
 async def run_demo():
@@ -221,7 +278,8 @@ async def scripted_demo():
 
 if __name__ == "__main__":
     import sys
+    
     if len(sys.argv) > 1 and sys.argv[1] == "--scripted":
-        asyncio.run(scripted_demo())
+        run(scripted_demo())
     else:
-        asyncio.run(run_demo())
+        run(run_demo())
@@ -0,0 +1,62 @@
+"""
+AgentBuy - Shared LLM Client
+
+One AsyncOpenAI client per API key for the whole process, all on a single
+pooled HTTP/2 connection to OpenAI.
+"""
+import os
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+_clients: dict[str, "AsyncOpenAI"] = {}
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the process-wide HTTP/2 connection pool used for OpenAI calls."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            # Match the SDK's own default timeouts; httpx's 5s would cut off completions
+            timeout=httpx.Timeout(600.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+            http2=True
+        )
+    return _http_client
+
+
+def get_shared_client(api_key: str = None) -> Optional["AsyncOpenAI"]:
+    """
+    Get the process-wide OpenAI client.
+
+    Args:
+        api_key: OpenAI API key (defaults to OPENAI_API_KEY)
+
+    Returns:
+        Shared client for that key, or None if no key is configured
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    client = _clients.get(api_key)
+    if client is None:
+        # Imported on first use so workers without a key never load the SDK
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=api_key, http_client=get_http_client())
+        _clients[api_key] = client
+    return client
+
+
+async def close_http_client():
+    """Close the shared pool; clients handed out so far stop working."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        _clients.clear()
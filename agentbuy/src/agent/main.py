@@ -4,11 +4,11 @@ AgentBuy - Main Agent
 The primary agent that combines the brain (reasoning) with tools.
 """
 import logging
-import os
-from typing import Optional
-
-from openai import AsyncOpenAI
+import re
+from types import MappingProxyType
+from typing import Awaitable, Callable, Mapping, Optional
 
+from src.agent.llm import get_shared_client
 from src.brain.reasoning import ReActEngine, AgentContext
 from src.tools.browser import BrowserTools
 from src.tools.auth import AgentAuthTools
@@ -17,6 +17,9 @@ from src.connectors.starbucks import StarbucksConnector
 
 logger = logging.getLogger(__name__)
 
+# Demo-mode coffee intent, matched without lowercasing the command
+_COFFEE_RE = re.compile(r"coffee|latte|starbucks", re.IGNORECASE)
+
 
 class PurchaseAgent:
     """
@@ -34,11 +37,11 @@ class PurchaseAgent:
         self,
         openai_api_key: str = None,
         agentauth_api_key: str = None,
-        headless: bool = True
+        headless: bool = True,
+        speculative: bool = False
     ):
-        # Initialize OpenAI client
-        api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-        self.llm = AsyncOpenAI(api_key=api_key) if api_key else None
+        # Shared OpenAI client (one HTTP/2 pool for every agent)
+        self.llm = get_shared_client(openai_api_key)
         
         # Initialize tools
         self.browser = BrowserTools(vision_client=self.llm, headless=headless)
@@ -54,20 +57,27 @@ class PurchaseAgent:
             self.brain = ReActEngine(
                 llm_client=self.llm,
                 tools=self.tools,
-                model="gpt-4o"
+                model="gpt-4o",
+                speculative=speculative
             )
         else:
             self.brain = None
             logger.warning("No OpenAI API key - agent will run in demo mode")
     
-    def _build_tool_registry(self) -> dict:
-        """Build the registry of all available tools."""
-        return {
+    def _build_tool_registry(self) -> Mapping[str, Callable]:
+        """
+        Build the registry of all available tools.
+        
+        Methods are bound once here and the mapping is read-only, so the
+        reasoning loop shares one registry and never rebuilds it.
+        """
+        return MappingProxyType({
             # Browser tools
             "browser_navigate": self.browser.navigate,
             "browser_click": self.browser.click,
             "browser_type": self.browser.type_text,
             "browser_screenshot": self.browser.screenshot,
+            "browser_extract_actions": self.browser.extract_actions,
             "browser_analyze_page": self.browser.analyze_page,
             "browser_get_text": self.browser.get_page_text,
             "browser_scroll": self.browser.scroll,
@@ -87,11 +97,11 @@ class PurchaseAgent:
             "ask_user": self.context.ask_user,
             
             # Starbucks-specific tools
-            "starbucks_search_menu": self.starbucks.search_items,
-            "starbucks_estimate_price": self.starbucks.estimate_price,
+            "starbucks_search_menu": self.starbucks.search_items_sync,
+            "starbucks_estimate_price": self.starbucks.estimate_price_sync,
             "starbucks_place_order": self._starbucks_order_wrapper,
             "starbucks_get_order_status": self.starbucks.get_order_status,
-        }
+        })
     
     async def _starbucks_order_wrapper(
         self,
@@ -118,13 +128,20 @@ class PurchaseAgent:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    async def execute(self, command: str, user_id: str) -> dict:
+    async def execute(
+        self,
+        command: str,
+        user_id: str,
+        on_delta: Callable[[str], Awaitable[None]] = None
+    ) -> dict:
         """
         Execute a user command using the full agentic loop.
         
         Args:
             command: Natural language command from user
             user_id: The user's ID for authorization
+            on_delta: Optional callback for the brain's output as it streams,
+                delivered in batches every 200ms or 16 chunks
             
         Returns:
             Result of the agent's execution including reasoning trace
@@ -138,17 +155,17 @@ class PurchaseAgent:
         # Run the ReAct loop
         result = await self.brain.run(
             goal=command,
-            user_id=user_id
+            user_id=user_id,
+            on_delta=on_delta,
+            stream_batch_interval=0.2
         )
         
         return result
     
     async def _demo_execute(self, command: str, user_id: str) -> dict:
         """Demo execution without full LLM reasoning."""
-        command_lower = command.lower()
-        
         # Simple keyword matching for demo
-        if any(word in command_lower for word in ["coffee", "latte", "starbucks"]):
+        if _COFFEE_RE.search(command):
             # Check budget
             budget = await self.auth.check_budget(user_id, "coffee", 10.0)
             
@@ -203,3 +220,4 @@ class PurchaseAgent:
         """Clean up resources."""
         await self.browser.close()
         await self.starbucks.close()
+        await self.auth.aclose()
@@ -3,14 +3,21 @@ AgentBuy - Agent Orchestrator
 
 Main orchestration logic that coordinates intent parsing, authorization, and execution.
 """
+import asyncio
+import base64
 import logging
+import time
 from dataclasses import dataclass
-from typing import Optional
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING, Optional
+
+import orjson
 
 from .intent_parser import IntentParser, ParsedIntent
 from ..connectors.base import PlatformConnector, Order, OrderStatus
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,6 +31,65 @@ class ExecutionResult:
     error: Optional[str] = None
 
 
+@dataclass
+class DelegationToken:
+    """
+    Constraints carried in an AgentAuth delegation token (a signed JWT).
+    
+    The signature uses AgentAuth's server secret and can't be checked here,
+    so these claims are only trusted to *reject* a purchase early. Approval
+    always goes through AgentAuth.
+    """
+    max_amount: Optional[float] = None
+    currency: Optional[str] = None
+    allowed_merchants: Optional[list[str]] = None
+    expires_at: Optional[float] = None
+    
+    @classmethod
+    def from_jwt(cls, token: str) -> Optional["DelegationToken"]:
+        """
+        Read the claims without verifying.
+        
+        Returns None if the token isn't a JWT or a claim has the wrong type,
+        leaving the decision to AgentAuth.
+        """
+        try:
+            payload = token.split(".")[1]
+            claims = orjson.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            constraints = claims.get("constraints") or {}
+            max_amount = constraints.get("max_amount")
+            currency = constraints.get("currency")
+            merchants = constraints.get("allowed_merchants")
+            expires_at = claims.get("exp")
+            if (
+                not isinstance(max_amount, (int, float, type(None)))
+                or not isinstance(currency, (str, type(None)))
+                or not (merchants is None or isinstance(merchants, list))
+                or not isinstance(expires_at, (int, float, type(None)))
+            ):
+                return None
+            return cls(
+                max_amount=max_amount,
+                currency=currency,
+                allowed_merchants=merchants,
+                expires_at=expires_at
+            )
+        except (IndexError, ValueError, AttributeError):
+            return None
+    
+    def rejects(self, amount: float, merchant_id: str, currency: str = "USD") -> Optional[str]:
+        """Return why AgentAuth would certainly deny this purchase, if it would."""
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            return "Delegation token has expired"
+        if self.max_amount is not None and amount > self.max_amount:
+            return f"Amount ${amount:.2f} exceeds consent limit of ${self.max_amount:.2f}"
+        if self.currency and self.currency != currency:
+            return f"Currency {currency} does not match consent currency {self.currency}"
+        if self.allowed_merchants and merchant_id not in self.allowed_merchants:
+            return f"Merchant {merchant_id} is not in the allowed list"
+        return None
+
+
 class AgentOrchestrator:
     """
     Main agent that orchestrates the purchase flow:
@@ -35,7 +101,7 @@ class AgentOrchestrator:
     
     def __init__(
         self,
-        openai_client: AsyncOpenAI,
+        openai_client: "AsyncOpenAI",
         agentauth_client,  # AgentAuthClient
         connectors: dict[str, PlatformConnector]
     ):
@@ -88,6 +154,16 @@ class AgentOrchestrator:
             logger.error(f"Price estimation failed: {e}")
             estimated_price = 20.0  # Default estimate for coffee
         
+        # Purchases the token's own limits rule out are denied without a round-trip
+        token = DelegationToken.from_jwt(delegation_token)
+        reason = token.rejects(estimated_price, intent.platform) if token else None
+        if reason:
+            return ExecutionResult(
+                success=False,
+                message=f"Purchase not authorized: {reason}",
+                error="authorization_denied"
+            )
+        
         logger.info(f"Requesting authorization for ${estimated_price}")
         auth_response = await self.agentauth.authorize(
             delegation_token=delegation_token,
@@ -131,6 +207,35 @@ class AgentOrchestrator:
                 error="execution_failed"
             )
     
+    async def execute_commands_batch(
+        self,
+        texts: list[str],
+        user_id: str,
+        delegation_token: str
+    ) -> list[ExecutionResult]:
+        """
+        Execute several independent commands concurrently.
+        
+        Intent parsing, authorization and ordering for each command overlap
+        with the others instead of running back to back. A command that
+        raises fails on its own; the others still run to completion.
+        
+        Returns:
+            ExecutionResults in the same order as texts
+        """
+        results = await asyncio.gather(
+            *(self.execute_command(text, user_id, delegation_token) for text in texts),
+            return_exceptions=True
+        )
+        return [
+            result if not isinstance(result, BaseException) else ExecutionResult(
+                success=False,
+                message=f"Failed to place order: {result}",
+                error="execution_failed"
+            )
+            for result in results
+        ]
+    
     async def get_order_status(self, order_id: str) -> Optional[OrderStatus]:
         """Get status of a pending order."""
         order = self.pending_orders.get(order_id)
@@ -155,6 +260,7 @@ class AgentOrchestrator:
         
         success = await connector.cancel_order(order_id)
         if success:
-            del self.pending_orders[order_id]
+            # A concurrent cancel may have removed it while we awaited
+            self.pending_orders.pop(order_id, None)
         
         return success
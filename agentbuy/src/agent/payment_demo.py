@@ -5,18 +5,137 @@ A focused demo agent that processes voice commands for payments.
 Uses AgentAuth for authorization and Stripe for payment execution.
 """
 import asyncio
+import hashlib
 import logging
 import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional
 
-from openai import AsyncOpenAI
 import httpx
+import orjson
 
+from src.agent.batcher import RequestBatcher
+from src.agent.llm import get_shared_client
+from src.agent.runner import run
+from src.agent.semantic_cache import SemanticIntentCache
 from src.tools.payments import StripePaymentTools
 from src.tools.auth import AgentAuthTools
+from src.voice.whisper import transcribe
 
 logger = logging.getLogger(__name__)
 
+# Exact-match intent cache bounds
+INTENT_CACHE_SIZE = 4096
+INTENT_CACHE_TTL_SECONDS = 1800
+
+# Kept byte-for-byte stable and sent first, so OpenAI's automatic prompt
+# caching can reuse the prefix if the prompt grows past its 1024-token minimum
+_INTENT_SYSTEM_PROMPT = """Extract payment intent from user message.
+Record it with:
+- action: "pay" or "subscribe" or "unknown"
+- amount: number (in dollars)
+- merchant: string (company/service name)
+- description: string (what the payment is for)
+- category: "saas" | "food" | "ecommerce" | "travel" | "other"
+
+Examples:
+"Pay $10 for Notion" -> {"action":"pay","amount":10,"merchant":"Notion","description":"Notion subscription","category":"saas"}
+"Buy lunch from DoorDash for $25" -> {"action":"pay","amount":25,"merchant":"DoorDash","description":"Food order","category":"food"}"""
+
+# Sent as the user message for batches
+_BATCH_INSTRUCTION = (
+    "The following JSON array holds several separate user messages. "
+    "Record one intent per message, in the same order.\n"
+)
+
+# The model is forced to call these, so it emits only the arguments JSON
+INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["pay", "subscribe", "unknown"]},
+        "amount": {"type": "number"},
+        "merchant": {"type": "string"},
+        "description": {"type": "string"},
+        "category": {"type": "string", "enum": ["saas", "food", "ecommerce", "travel", "other"]}
+    },
+    "required": ["action"]
+}
+_RECORD_INTENT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "record_intent",
+        "description": "Record the payment intent in the user's message",
+        "parameters": INTENT_SCHEMA
+    }
+}
+_RECORD_INTENTS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "record_intents",
+        "description": "Record one payment intent per user message",
+        "parameters": {
+            "type": "object",
+            "properties": {"intents": {"type": "array", "items": INTENT_SCHEMA}},
+            "required": ["intents"]
+        }
+    }
+}
+
+# Keyword parsing used when no OpenAI key is configured
+_AMOUNT_RE = re.compile(r'\$?(\d+(?:\.\d{2})?)')
+_DEMO_MERCHANTS = {
+    "notion": ("Notion", "saas"),
+    "digitalocean": ("DigitalOcean", "saas"),
+    "doordash": ("DoorDash", "food"),
+    "uber": ("Uber", "travel"),
+    "amazon": ("Amazon", "ecommerce"),
+    "starbucks": ("Starbucks", "food"),
+    "spotify": ("Spotify", "saas"),
+    "netflix": ("Netflix", "saas"),
+}
+# Lookahead so overlapping keys are all reported
+_MERCHANT_RE = re.compile("(?=(" + "|".join(re.escape(k) for k in _DEMO_MERCHANTS) + "))")
+
+
+@lru_cache(maxsize=4096)
+def _demo_parse_fast(text: str) -> tuple[float, Optional[str]]:
+    """
+    Scan a command for its amount and merchant key.
+    
+    Memoized because demo traffic repeats the same few commands.
+    
+    Returns:
+        (amount, merchant key or None)
+    """
+    # Extract amount (look for $XX or XX dollars)
+    amount_match = _AMOUNT_RE.search(text)
+    amount = float(amount_match.group(1)) if amount_match else 10.0
+    
+    # Detect merchant: one scan finds every key, the table order breaks ties
+    found = set(_MERCHANT_RE.findall(text.lower()))
+    key = next((k for k in _DEMO_MERCHANTS if k in found), None)
+    return amount, key
+
+
+def _tool_arguments(response) -> dict:
+    """Decode the arguments of the forced tool call."""
+    tool_calls = response.choices[0].message.tool_calls
+    if not tool_calls:
+        return {"action": "unknown"}
+    return orjson.loads(tool_calls[0].function.arguments)
+
+
+def _log_cache_usage(response):
+    """Log how much of the prompt was served from OpenAI's prompt cache."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    if details is not None:
+        logger.debug(f"Prompt tokens: {usage.prompt_tokens}, cached: {details.cached_tokens or 0}")
+
 
 class PaymentDemoAgent:
     """
@@ -37,84 +156,205 @@ class PaymentDemoAgent:
         agentauth_key: str = None,
         stripe_key: str = None
     ):
-        # OpenAI for intent parsing
-        api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-        self.llm = AsyncOpenAI(api_key=api_key) if api_key else None
+        # Shared OpenAI client for intent parsing
+        self.llm = get_shared_client(openai_api_key)
+        
+        # Repeated commands reuse earlier parses: exact matches first, then paraphrases
+        self._exact_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._exact_cache_lock = asyncio.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+        # One user's commands arriving within 20ms of each other share one LLM call
+        self._intent_batcher = RequestBatcher(self._complete_intents, window=0.02)
+        self.intent_cache = SemanticIntentCache(
+            self.llm,
+            db_path=os.getenv("INTENT_CACHE_DB")
+        ) if self.llm else None
+        
+        # One pooled HTTP/2 connection for every AgentAuth call in the flow
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+            timeout=10.0
+        )
         
         # AgentAuth for authorization
         self.agentauth_url = agentauth_url or os.getenv("AGENTAUTH_API_URL", "http://localhost:8000")
         self.agentauth_key = agentauth_key or os.getenv("AGENTAUTH_API_KEY")
-        self.auth_tools = AgentAuthTools(api_url=self.agentauth_url, api_key=self.agentauth_key)
+        self.auth_tools = AgentAuthTools(
+            api_url=self.agentauth_url,
+            api_key=self.agentauth_key,
+            client=self._http
+        )
         
         # Stripe for payments
         self.stripe = StripePaymentTools(api_key=stripe_key)
+        self._background: set[asyncio.Task] = set()
+    
+    async def aclose(self):
+        """Wait for background cleanup and close the pooled HTTP client."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self._http.aclose()
+    
+    async def parse_payment_intent(self, text: str, user_id: str = None) -> dict:
+        """
+        Parse payment intent from text using GPT-4.
+        
+        Args:
+            text: The command to parse
+            user_id: Who sent it; commands from the same user arriving
+                together share one completion
+        """
+        return await self._parse(text, batch_key=user_id)
     
-    async def parse_payment_intent(self, text: str) -> dict:
-        """Parse payment intent from text using GPT-4."""
+    async def parse_payment_intents_batch(self, texts: list[str], user_id: str = None) -> list[dict]:
+        """
+        Parse several commands from one sender together.
+        
+        Cached commands are answered locally and the misses share a single
+        chat completion, so the system prompt is sent once for the batch.
+        
+        Args:
+            texts: Commands to parse
+            user_id: Who sent them
+            
+        Returns:
+            One intent dict per command, in input order
+        """
+        # Without a user these texts still batch together, but with nobody else's
+        batch_key = user_id if user_id is not None else object()
+        return list(await asyncio.gather(*(self._parse(text, batch_key) for text in texts)))
+    
+    async def _parse(self, text: str, batch_key) -> dict:
+        """Parse through the exact-match cache and in-flight requests."""
         if not self.llm:
             # Demo fallback parsing
             return self._demo_parse(text)
         
+        key = hashlib.md5(text.strip().lower().encode()).hexdigest() if text.strip() else None
+        if key:
+            async with self._exact_cache_lock:
+                entry = self._exact_cache.get(key)
+                if entry and time.monotonic() - entry[0] < INTENT_CACHE_TTL_SECONDS:
+                    self._exact_cache.move_to_end(key)
+                    return dict(entry[1])
+            
+            # Identical commands already being parsed share that one request
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._parse_uncached(text, key, batch_key))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return dict(await asyncio.shield(task))
+        
+        return await self._parse_uncached(text, key, batch_key)
+    
+    async def _parse_uncached(self, text: str, key: Optional[str], batch_key=None) -> dict:
+        """Parse through the semantic cache, then the LLM."""
         try:
+            vector = await self.intent_cache.embed(text)
+            cached = await self.intent_cache.lookup(text, vector)
+            if cached is not None:
+                await self._remember_intent(key, cached)
+                return cached
+        except Exception as e:
+            logger.warning(f"Intent cache unavailable: {e}")
+            vector = None
+        
+        try:
+            if batch_key is None:
+                intent = (await self._complete_intents([text]))[0]
+            else:
+                # Only one sender's commands are fused into a completion, so
+                # one user's text can never steer another's parse
+                intent = await self._intent_batcher.submit(text, key=batch_key)
+        except Exception as e:
+            logger.error(f"Intent parsing failed: {e}")
+            return {"action": "unknown", "error": str(e)}
+        
+        if intent.get("action") != "unknown":
+            await self._remember_intent(key, intent)
+            if vector is not None:
+                await self.intent_cache.add(text, vector, intent)
+        return intent
+    
+    async def _complete_intents(self, texts: list[str]) -> list[dict]:
+        """Parse commands with one chat completion; one intent per text, in order."""
+        if len(texts) == 1:
             response = await self.llm.chat.completions.create(
                 model="gpt-4o",
                 messages=[
-                    {
-                        "role": "system",
-                        "content": """Extract payment intent from user message.
-Return JSON with:
-- action: "pay" or "subscribe" or "unknown"
-- amount: number (in dollars)
-- merchant: string (company/service name)
-- description: string (what the payment is for)
-- category: "saas" | "food" | "ecommerce" | "travel" | "other"
-
-Examples:
-"Pay $10 for Notion" -> {"action":"pay","amount":10,"merchant":"Notion","description":"Notion subscription","category":"saas"}
-"Buy lunch from DoorDash for $25" -> {"action":"pay","amount":25,"merchant":"DoorDash","description":"Food order","category":"food"}"""
-                    },
-                    {"role": "user", "content": text}
+                    {"role": "system", "content": _INTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": texts[0]}
                 ],
-                response_format={"type": "json_object"},
+                tools=[_RECORD_INTENT_TOOL],
+                tool_choice={"type": "function", "function": {"name": "record_intent"}},
+                max_tokens=80,
                 temperature=0.1
             )
-            
-            import json
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            logger.error(f"Intent parsing failed: {e}")
-            return {"action": "unknown", "error": str(e)}
-    
-    def _demo_parse(self, text: str) -> dict:
-        """Simple keyword-based parsing for demo."""
-        text_lower = text.lower()
+            _log_cache_usage(response)
+            return [_tool_arguments(response)]
         
-        # Extract amount (look for $XX or XX dollars)
-        import re
-        amount_match = re.search(r'\$?(\d+(?:\.\d{2})?)', text)
-        amount = float(amount_match.group(1)) if amount_match else 10.0
+        try:
+            response = await self.llm.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": _INTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": _BATCH_INSTRUCTION + orjson.dumps(texts).decode()}
+                ],
+                tools=[_RECORD_INTENTS_TOOL],
+                tool_choice={"type": "function", "function": {"name": "record_intents"}},
+                max_tokens=80 * len(texts),
+                temperature=0.1
+            )
+            _log_cache_usage(response)
+            parsed = _tool_arguments(response).get("intents", [])
+        except Exception as e:
+            logger.error(f"Batch intent parsing failed: {e}")
+            parsed = []
         
-        # Detect merchant
-        merchants = {
-            "notion": ("Notion", "saas"),
-            "digitalocean": ("DigitalOcean", "saas"),
-            "doordash": ("DoorDash", "food"),
-            "uber": ("Uber", "travel"),
-            "amazon": ("Amazon", "ecommerce"),
-            "starbucks": ("Starbucks", "food"),
-            "spotify": ("Spotify", "saas"),
-            "netflix": ("Netflix", "saas"),
-        }
+        if len(parsed) == len(texts) and all(isinstance(p, dict) for p in parsed):
+            return parsed
         
-        merchant_name = "Unknown Merchant"
-        category = "other"
+        # Misaligned or failed batch: parse each command on its own
+        logger.warning(f"Batch returned {len(parsed)} intents for {len(texts)} commands")
+        results = await asyncio.gather(
+            *(self._complete_intents([text]) for text in texts),
+            return_exceptions=True
+        )
+        return [
+            {"action": "unknown", "error": str(r)} if isinstance(r, Exception) else r[0]
+            for r in results
+        ]
+    
+    def _discard_prepared(self, prepare_task: asyncio.Task):
+        """Cancel a prepared PaymentIntent in the background once it exists."""
+        async def discard():
+            try:
+                prepared = await prepare_task
+                if prepared.get("success"):
+                    await self.stripe.cancel_payment(prepared["payment_intent_id"])
+            except Exception as e:
+                logger.warning(f"Could not discard prepared payment: {e}")
         
-        for key, (name, cat) in merchants.items():
-            if key in text_lower:
-                merchant_name = name
-                category = cat
-                break
+        task = asyncio.create_task(discard())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def _remember_intent(self, key: Optional[str], intent: dict):
+        """Store a parsed intent in the exact-match cache."""
+        if not key:
+            return
+        async with self._exact_cache_lock:
+            self._exact_cache[key] = (time.monotonic(), dict(intent))
+            self._exact_cache.move_to_end(key)
+            if len(self._exact_cache) > INTENT_CACHE_SIZE:
+                self._exact_cache.popitem(last=False)
+    
+    def _demo_parse(self, text: str) -> dict:
+        """Simple keyword-based parsing for demo."""
+        amount, key = _demo_parse_fast(text)
+        merchant_name, category = _DEMO_MERCHANTS[key] if key else ("Unknown Merchant", "other")
         
         return {
             "action": "pay",
@@ -128,7 +368,8 @@ Examples:
         self,
         audio_bytes: bytes = None,
         text: str = None,
-        user_id: str = "demo_user"
+        user_id: str = "demo_user",
+        intent: dict = None
     ) -> dict:
         """
         Process a voice or text command for payment.
@@ -137,33 +378,26 @@ Examples:
             audio_bytes: Raw audio data (will be transcribed)
             text: Text command (if no audio)
             user_id: User ID for authorization
+            intent: Already-parsed intent for text (skips parsing)
             
         Returns:
             Complete payment result with authorization and payment details
         """
         # Step 1: Transcribe audio if provided
         if audio_bytes and self.llm:
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as f:
-                f.write(audio_bytes)
-                temp_path = f.name
-            
-            try:
-                with open(temp_path, "rb") as audio_file:
-                    transcript = await self.llm.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file
-                    )
-                text = transcript.text
-                logger.info(f"Transcribed: {text}")
-            finally:
-                os.unlink(temp_path)
+            # Upload straight from memory; no temp file blocking the event loop
+            text = await transcribe(
+                audio_bytes,
+                api_key=self.llm.api_key,
+                base_url=str(self.llm.base_url)
+            )
         
         if not text:
             return {"success": False, "error": "No input provided"}
         
         # Step 2: Parse payment intent
-        intent = await self.parse_payment_intent(text)
+        if intent is None:
+            intent = await self.parse_payment_intent(text, user_id=user_id)
         logger.info(f"Parsed intent: {intent}")
         
         if intent.get("action") == "unknown":
@@ -178,37 +412,55 @@ Examples:
         category = intent.get("category", "other")
         description = intent.get("description", f"Payment to {merchant}")
         
-        # Step 3: Request AgentAuth authorization
+        # Step 3: Request AgentAuth authorization, preparing the Stripe payment meanwhile
         logger.info(f"Requesting authorization for ${amount} to {merchant}")
         
-        auth_result = await self.auth_tools.request_authorization(
+        auth_task = asyncio.create_task(self.auth_tools.request_authorization(
             user_id=user_id,
             amount=amount,
             merchant=merchant,
             description=description,
             category=category
-        )
-        
-        if not auth_result.get("allowed"):
-            return {
-                "success": False,
-                "step": "authorization",
-                "error": auth_result.get("reason", "Not authorized"),
-                "amount": amount,
-                "merchant": merchant,
-                "message": f"Payment of ${amount:.2f} to {merchant} was DENIED: {auth_result.get('reason', 'Over budget')}"
-            }
-        
-        auth_code = auth_result.get("authorization_code")
-        logger.info(f"Authorized: {auth_code}")
-        
-        # Step 4: Process Stripe payment
-        payment_result = await self.stripe.process_payment(
+        ))
+        prepare_task = asyncio.create_task(self.stripe.prepare_payment(
             amount=amount,
             merchant_name=merchant,
-            description=description,
-            authorization_code=auth_code
-        )
+            description=description
+        ))
+        
+        # Until the payment is confirmed, any failure (or cancellation) must
+        # not leave the prepared PaymentIntent behind
+        try:
+            auth_result = await auth_task
+            
+            if not auth_result.get("allowed"):
+                self._discard_prepared(prepare_task)
+                return {
+                    "success": False,
+                    "step": "authorization",
+                    "error": auth_result.get("reason", "Not authorized"),
+                    "amount": amount,
+                    "merchant": merchant,
+                    "message": f"Payment of ${amount:.2f} to {merchant} was DENIED: {auth_result.get('reason', 'Over budget')}"
+                }
+            
+            auth_code = auth_result.get("authorization_code")
+            logger.info(f"Authorized: {auth_code}")
+            
+            # Step 4: Confirm the prepared Stripe payment
+            prepared = await prepare_task
+            if prepared.get("success"):
+                payment_result = await self.stripe.confirm_prepared_payment(
+                    payment_intent_id=prepared["payment_intent_id"],
+                    amount=amount,
+                    merchant_name=merchant,
+                    authorization_code=auth_code
+                )
+            else:
+                payment_result = prepared
+        except BaseException:
+            self._discard_prepared(prepare_task)
+            raise
         
         if not payment_result.get("success"):
             return {
@@ -255,27 +507,39 @@ async def demo():
     
     agent = PaymentDemoAgent()
     
-    # Test commands
-    commands = [
-        "Pay $10 for my Notion subscription",
-        "Buy lunch from DoorDash for $25",
-        "Pay $500 for something expensive",  # Should be denied
-    ]
-    
-    for cmd in commands:
-        print(f"\n🎤 Command: \"{cmd}\"")
-        print("-"*50)
+    try:
+        # Test commands
+        commands = [
+            "Pay $10 for my Notion subscription",
+            "Buy lunch from DoorDash for $25",
+            "Pay $500 for something expensive",  # Should be denied
+        ]
         
-        result = await agent.process_voice_command(text=cmd, user_id="demo_user")
+        # Parse every command in one LLM call, then run them concurrently
+        intents = await agent.parse_payment_intents_batch(commands, user_id="demo_user")
+        results = await asyncio.gather(
+            *(
+                agent.process_voice_command(text=cmd, user_id="demo_user", intent=intent)
+                for cmd, intent in zip(commands, intents)
+            )
+        )
         
-        if result.get("success"):
-            print(f"✅ {result.get('message')}")
-            for step in result.get("steps", []):
-                print(f"   {step}")
-        else:
-            print(f"❌ {result.get('message', result.get('error'))}")
+        # Render everything, then write it in one go
+        lines = []
+        for cmd, result in zip(commands, results):
+            lines.append(f"\n🎤 Command: \"{cmd}\"")
+            lines.append("-"*50)
+            
+            if result.get("success"):
+                lines.append(f"✅ {result.get('message')}")
+                lines.extend(f"   {step}" for step in result.get("steps", []))
+            else:
+                lines.append(f"❌ {result.get('message', result.get('error'))}")
         
-        await asyncio.sleep(0.5)
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+    finally:
+        await agent.aclose()
     
     print("\n" + "="*60)
     print("✨ DEMO COMPLETE")
@@ -283,4 +547,4 @@ async def demo():
 
 
 if __name__ == "__main__":
-    asyncio.run(demo())
+    run(demo())
@@ -0,0 +1,28 @@
+"""
+AgentBuy - Script Runner
+
+Runs a demo's entry coroutine on uvloop when it is installed (it ships with
+uvicorn[standard]), and on the default asyncio loop otherwise.
+"""
+import asyncio
+from typing import Any, Coroutine
+
+
+def run(main: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run main to completion on a fresh event loop.
+
+    Args:
+        main: The script's top-level coroutine
+
+    Returns:
+        Whatever main returns
+    """
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        return runner.run(main)
@@ -0,0 +1,198 @@
+"""
+AgentBuy - Semantic Intent Cache
+
+Caches parsed intents by embedding similarity so paraphrased commands
+("Pay $10 for Notion" / "Pay 10 dollars to Notion") skip the LLM call.
+Entries can be persisted to SQLite so the cache survives restarts and is
+shared between processes.
+"""
+import asyncio
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, Optional
+
+import orjson
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+# Commands that differ only in an amount or a merchant embed almost
+# identically, so a hit also requires both texts to carry the same numbers
+# and the same words outside everyday command phrasing.
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_WORD_RE = re.compile(r"[a-z]+")
+_FILLER_WORDS = frozenset("""
+    a an the my me our us i you your it its this that to for from on in at of
+    with and or by per please can could would will just now some
+    pay paid send sent transfer give buy get grab order book make charge
+    subscribe subscription renew renewal sign up top start
+    dollar dollars buck bucks usd cent cents about around
+""".split())
+
+# (created_at, (numbers, entities), vector, intent)
+_Entry = tuple[float, tuple, array, dict]
+
+
+def _numbers(text: str) -> tuple[float, ...]:
+    return tuple(float(n) for n in _NUMBER_RE.findall(text))
+
+
+def _entities(text: str) -> tuple[str, ...]:
+    """Words naming something, e.g. a merchant or an item, in sorted order."""
+    return tuple(sorted(set(_WORD_RE.findall(text.lower())) - _FILLER_WORDS))
+
+
+def _normalize(vector: list[float]) -> array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+def _best_match(vector: array, entries: list[_Entry], cutoff: float, threshold: float) -> Optional[dict]:
+    """The intent of the most similar unexpired entry at or above threshold."""
+    best, best_score = None, threshold
+    for created_at, _, entry_vector, intent in entries:
+        if created_at < cutoff:
+            continue
+        score = sum(a * b for a, b in zip(vector, entry_vector))
+        if score >= best_score:
+            best, best_score = intent, score
+    return best
+
+
+class SemanticIntentCache:
+    """
+    Nearest-neighbour cache of parsed intents keyed by text embeddings.
+
+    Entries are bucketed by their numbers and entity words, so a lookup only
+    compares vectors with commands that could share its intent. Vectors are
+    unit-normalized, so cosine similarity is a plain dot product; the scan
+    and SQLite writes run in a worker thread to keep the event loop free.
+    """
+
+    def __init__(
+        self,
+        llm: "AsyncOpenAI",
+        threshold: float = 0.92,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 2048,
+        db_path: str = None,
+        model: str = "text-embedding-3-small",
+        dimensions: int = 256
+    ):
+        self.llm = llm
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.model = model
+        self.dimensions = dimensions
+        # Oldest first, for eviction, and (numbers, entities) -> entries
+        self._entries: deque[tuple[tuple, _Entry]] = deque()
+        self._buckets: dict[tuple, list[_Entry]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache ("
+                "created_at REAL, numbers BLOB, vector BLOB, intent BLOB, entities BLOB)"
+            )
+            try:
+                # Tables from before the entity guard; their rows can't be used
+                self._db.execute("ALTER TABLE intent_cache ADD COLUMN entities BLOB")
+            except sqlite3.OperationalError:
+                pass
+            self._load()
+
+    def _load(self):
+        """Load unexpired entries from SQLite."""
+        cutoff = time.time() - self.ttl_seconds
+        self._db.execute(
+            "DELETE FROM intent_cache WHERE created_at < ? OR entities IS NULL", (cutoff,)
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT created_at, numbers, entities, vector, intent FROM intent_cache "
+            "ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for created_at, numbers, entities, vector, intent in reversed(rows):
+            vec = array("f")
+            vec.frombytes(vector)
+            key = (tuple(orjson.loads(numbers)), tuple(orjson.loads(entities)))
+            self._insert(key, (created_at, key, vec, orjson.loads(intent)))
+        logger.info(f"Loaded {len(self._entries)} cached intents")
+
+    def _insert(self, key: tuple, entry: _Entry):
+        self._entries.append((key, entry))
+        self._buckets.setdefault(key, []).append(entry)
+        if len(self._entries) > self.max_entries:
+            old_key, old_entry = self._entries.popleft()
+            bucket = self._buckets[old_key]
+            bucket.remove(old_entry)
+            if not bucket:
+                del self._buckets[old_key]
+
+    async def embed(self, text: str) -> array:
+        """Embed and normalize a command."""
+        response = await self.llm.embeddings.create(
+            model=self.model,
+            input=text,
+            dimensions=self.dimensions
+        )
+        return _normalize(response.data[0].embedding)
+
+    async def lookup(self, text: str, vector: array) -> Optional[dict]:
+        """
+        Find a cached intent for a semantically equivalent command.
+
+        Args:
+            text: The command text
+            vector: Its embedding from embed()
+
+        Returns:
+            A copy of the cached intent, or None on a miss
+        """
+        bucket = self._buckets.get((_numbers(text), _entities(text)))
+        if not bucket:
+            return None
+        best = await asyncio.to_thread(
+            _best_match, vector, list(bucket), time.time() - self.ttl_seconds, self.threshold
+        )
+        return dict(best) if best is not None else None
+
+    async def add(self, text: str, vector: array, intent: dict):
+        """Store a freshly parsed intent."""
+        created_at = time.time()
+        key = (_numbers(text), _entities(text))
+        self._insert(key, (created_at, key, vector, dict(intent)))
+
+        if self._db:
+            await asyncio.to_thread(
+                self._write,
+                (
+                    created_at,
+                    orjson.dumps(key[0]),
+                    vector.tobytes(),
+                    orjson.dumps(intent),
+                    orjson.dumps(key[1])
+                )
+            )
+
+    def _write(self, row: tuple):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO intent_cache (created_at, numbers, vector, intent, entities) "
+                "VALUES (?, ?, ?, ?, ?)",
+                row
+            )
+            self._db.commit()
@@ -3,29 +3,52 @@ AgentBuy - FastAPI Application
 
 REST API for the Universal AI Purchase Agent.
 """
+import asyncio
 import logging
-from contextlib import asynccontextmanager
-from typing import Optional
+import re
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import TYPE_CHECKING, Optional
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Response, UploadFile, File, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from openai import AsyncOpenAI
 import os
-from dotenv import load_dotenv
 
+from ..agent.llm import close_http_client, get_shared_client
 from ..agent.orchestrator import AgentOrchestrator, ExecutionResult
-from ..connectors.starbucks import StarbucksConnector
+from ..connectors.base import Order
+from ..connectors.starbucks import StarbucksConnector, close_shared_browser
+from ..voice.realtime import RealtimeTranscriber
+from ..voice.whisper import transcribe
+from .responses import json_response
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+if not os.getenv("AGENTBUY_NO_DOTENV"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Demo-mode keyword detection, compiled once
+_PLATFORM_RE = re.compile(r"starbucks|coffee|latte", re.IGNORECASE)
+_SIZES = ("tall", "grande", "venti", "trenta")
+_SIZE_RE = re.compile("|".join(_SIZES), re.IGNORECASE)
+
+# Demo orders are kept for status checks, within these bounds
+DEMO_ORDERS_MAX = 10_000
+DEMO_ORDER_TTL_SECONDS = 3600
+
+
 # Global instances
 orchestrator: Optional[AgentOrchestrator] = None
+openai_client: Optional["AsyncOpenAI"] = None
 
 
 class DemoOrchestrator:
@@ -37,14 +60,16 @@ class DemoOrchestrator:
     def __init__(self, agentauth_client, connectors):
         self.agentauth = agentauth_client
         self.connectors = connectors
-        self.pending_orders = {}
+        # order_id -> (created_at, order), oldest first
+        self.pending_orders: OrderedDict[str, tuple[float, Order]] = OrderedDict()
+        # (platform, size) -> estimated price; the demo item is fixed, so this
+        # stays at a handful of entries
+        self._price_cache: dict[tuple[str, str], float] = {}
     
     async def execute_command(self, text: str, user_id: str, delegation_token: str):
         """Demo command execution with keyword matching."""
-        text_lower = text.lower()
-        
         # Simple keyword-based platform detection
-        platform = "starbucks" if "starbucks" in text_lower or "coffee" in text_lower or "latte" in text_lower else None
+        platform = "starbucks" if _PLATFORM_RE.search(text) else None
         
         if not platform:
             return ExecutionResult(
@@ -61,18 +86,21 @@ class DemoOrchestrator:
                 error="no_connector"
             )
         
-        # Extract size (simple keyword match)
-        size = "grande"  # default
-        for s in ["tall", "grande", "venti", "trenta"]:
-            if s in text_lower:
-                size = s
-                break
+        # Extract size (simple keyword match, earlier sizes win ties)
+        found = {m.lower() for m in _SIZE_RE.findall(text)}
+        size = next((s for s in _SIZES if s in found), "grande")
         
         # Create demo item
         items = [{"name": "Iced Latte (Demo)", "size": size, "quantity": 1}]
         
         # Estimate price and authorize
-        estimated_price = await connector.estimate_price(items)
+        estimated_price = self._price_cache.get((platform, size))
+        if estimated_price is None:
+            try:
+                estimated_price = connector.estimate_price_sync(items)
+            except NotImplementedError:
+                estimated_price = await connector.estimate_price(items)
+            self._price_cache[(platform, size)] = estimated_price
         auth = await self.agentauth.authorize(
             delegation_token=delegation_token,
             amount=estimated_price,
@@ -95,7 +123,7 @@ class DemoOrchestrator:
             location="Demo Store"
         )
         
-        self.pending_orders[order.order_id] = order
+        self._remember_order(order)
         
         return ExecutionResult(
             success=True,
@@ -104,20 +132,39 @@ class DemoOrchestrator:
             authorization_code=auth.authorization_code
         )
     
+    def _remember_order(self, order: Order):
+        """Store an order, dropping expired and oldest ones past the bounds."""
+        now = time.monotonic()
+        self.pending_orders[order.order_id] = (now, order)
+        while self.pending_orders:
+            created_at, _ = next(iter(self.pending_orders.values()))
+            if len(self.pending_orders) <= DEMO_ORDERS_MAX and now - created_at < DEMO_ORDER_TTL_SECONDS:
+                break
+            self.pending_orders.popitem(last=False)
+    
+    def _get_order(self, order_id: str) -> Optional[Order]:
+        entry = self.pending_orders.get(order_id)
+        if not entry:
+            return None
+        if time.monotonic() - entry[0] >= DEMO_ORDER_TTL_SECONDS:
+            self.pending_orders.pop(order_id, None)
+            return None
+        return entry[1]
+    
     async def get_order_status(self, order_id: str):
-        order = self.pending_orders.get(order_id)
+        order = self._get_order(order_id)
         if not order:
             return None
         connector = self.connectors.get(order.platform)
         return await connector.get_order_status(order_id) if connector else None
     
     async def cancel_order(self, order_id: str):
-        order = self.pending_orders.get(order_id)
+        order = self._get_order(order_id)
         if not order:
             return False
         connector = self.connectors.get(order.platform)
         if connector and await connector.cancel_order(order_id):
-            del self.pending_orders[order_id]
+            self.pending_orders.pop(order_id, None)
             return True
         return False
 
@@ -125,15 +172,13 @@ class DemoOrchestrator:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize and cleanup resources."""
-    global orchestrator
+    global orchestrator, openai_client
     
     # Initialize OpenAI client (optional - for demo mode)
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if openai_api_key:
-        openai_client = AsyncOpenAI(api_key=openai_api_key)
+    openai_client = get_shared_client()
+    if openai_client:
         logger.info("OpenAI client initialized")
     else:
-        openai_client = None
         logger.warning("OPENAI_API_KEY not set - running in demo mode with mock parser")
     
     # Initialize connectors
@@ -166,10 +211,18 @@ async def lifespan(app: FastAPI):
         )
     
     logger.info("AgentBuy API initialized")
-    yield
-    
-    # Cleanup
-    await starbucks.close()
+    # Every step runs, newest first, even if an earlier one raises
+    async with AsyncExitStack() as cleanup:
+        cleanup.push_async_callback(close_http_client)
+        cleanup.push_async_callback(close_shared_browser)
+        cleanup.push_async_callback(starbucks.close)
+        try:
+            yield
+        finally:
+            # Requests arriving during shutdown see the service as
+            # uninitialized rather than using closed clients
+            orchestrator = None
+            openai_client = None
     logger.info("AgentBuy API shutdown")
 
 
@@ -217,6 +270,19 @@ class OrderStatusResponse(BaseModel):
     estimated_ready: Optional[str] = None
 
 
+def _command_response(result: ExecutionResult) -> Response:
+    """Pack an ExecutionResult into a CommandResponse."""
+    order = result.order
+    return json_response(CommandResponse.model_construct(
+        success=result.success,
+        message=result.message,
+        order_id=order.order_id if order else None,
+        total_price=order.total_price if order else None,
+        platform=order.platform if order else None,
+        estimated_ready=order.estimated_ready.isoformat() if order and order.estimated_ready else None
+    ))
+
+
 # ============== ENDPOINTS ==============
 
 @app.get("/health")
@@ -242,14 +308,7 @@ async def execute_command(request: CommandRequest):
         delegation_token=request.delegation_token
     )
     
-    return CommandResponse(
-        success=result.success,
-        message=result.message,
-        order_id=result.order.order_id if result.order else None,
-        total_price=result.order.total_price if result.order else None,
-        platform=result.order.platform if result.order else None,
-        estimated_ready=result.order.estimated_ready.isoformat() if result.order and result.order.estimated_ready else None
-    )
+    return _command_response(result)
 
 
 @app.post("/v1/voice", response_model=CommandResponse)
@@ -265,46 +324,117 @@ async def execute_voice_command(
     """
     if not orchestrator:
         raise HTTPException(status_code=503, detail="Service not initialized")
+    if not openai_client:
+        raise HTTPException(status_code=503, detail="Voice commands require OPENAI_API_KEY")
     
     # Read audio file
     audio_bytes = await audio.read()
     
-    # Transcribe using OpenAI Whisper
-    openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Transcribe using OpenAI Whisper, uploading straight from memory
+    text = await transcribe(
+        audio_bytes,
+        api_key=openai_client.api_key,
+        filename=audio.filename or "audio.webm",
+        base_url=str(openai_client.base_url)
+    )
     
-    # Save temporarily for API
-    import tempfile
-    with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as f:
-        f.write(audio_bytes)
-        temp_path = f.name
+    # Execute the transcribed command
+    result = await orchestrator.execute_command(
+        text=text,
+        user_id=user_id,
+        delegation_token=delegation_token
+    )
     
+    return _command_response(result)
+
+
+@app.websocket("/v1/voice/stream")
+async def stream_voice_commands(
+    websocket: WebSocket,
+    user_id: str = "anonymous",
+    delegation_token: str = "mock_token"
+):
+    """
+    Execute voice commands from a live audio stream.
+    
+    Send 16-bit PCM (24kHz, mono) frames as binary messages, then the text
+    message "end" once the user stops. Speech is transcribed while the user
+    is still talking, and each utterance is executed as soon as its
+    transcript completes, so only the last one is left to process after
+    "end". Results come back as CommandResponse JSON, and the server closes
+    the socket once every utterance has been handled.
+    
+    If the client disconnects without "end", audio after the last completed
+    utterance is dropped, but a command already executing is seen through.
+    """
+    await websocket.accept()
+    if not orchestrator or not openai_client:
+        await websocket.close(code=1013, reason="Voice commands require OPENAI_API_KEY")
+        return
+    
+    transcriber = RealtimeTranscriber(api_key=openai_client.api_key)
     try:
-        with open(temp_path, "rb") as audio_file:
-            transcript = await openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
-        
-        logger.info(f"Transcribed: {transcript.text}")
-        
-        # Execute the transcribed command
-        result = await orchestrator.execute_command(
-            text=transcript.text,
-            user_id=user_id,
-            delegation_token=delegation_token
-        )
-        
-        return CommandResponse(
-            success=result.success,
-            message=result.message,
-            order_id=result.order.order_id if result.order else None,
-            total_price=result.order.total_price if result.order else None,
-            platform=result.order.platform if result.order else None,
-            estimated_ready=result.order.estimated_ready.isoformat() if result.order and result.order.estimated_ready else None
-        )
+        await transcriber.connect()
+    except Exception as e:
+        logger.error(f"Realtime transcription unavailable: {e}")
+        await transcriber.close()
+        await websocket.close(code=1011, reason="Transcription unavailable")
+        return
+    
+    client_connected = True
+    
+    async def send_result(result: ExecutionResult):
+        if client_connected:
+            try:
+                await websocket.send_text(_command_response(result).body.decode())
+            except Exception as e:
+                logger.warning(f"Could not send voice command result: {e}")
+    
+    async def execute_transcripts():
+        async for text in transcriber.transcripts():
+            try:
+                result = await orchestrator.execute_command(
+                    text=text,
+                    user_id=user_id,
+                    delegation_token=delegation_token
+                )
+            except Exception as e:
+                logger.error(f"Voice command failed: {e}")
+                result = ExecutionResult(success=False, message=f"Command failed: {e}", error=str(e))
+            await send_result(result)
+    
+    executor = asyncio.create_task(execute_transcripts())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                client_connected = False
+                break
+            if message.get("bytes") is not None:
+                await transcriber.send_audio(message["bytes"])
+            elif message.get("text") == "end":
+                await transcriber.finish()
+                break
+            if executor.done():
+                break
+    except WebSocketDisconnect:
+        client_connected = False
+    except Exception as e:
+        logger.error(f"Voice stream failed: {e}")
+    
+    try:
+        if not client_connected:
+            # Stop reading transcripts; the command in flight still finishes
+            await transcriber.close()
+        await executor
+    except Exception as e:
+        logger.error(f"Voice transcription failed: {e}")
+        await send_result(ExecutionResult(success=False, message=f"Transcription failed: {e}", error=str(e)))
     finally:
-        import os as os_module
-        os_module.unlink(temp_path)
+        await transcriber.close()
+    
+    if client_connected:
+        await websocket.close()
 
 
 @app.get("/v1/orders/{order_id}", response_model=OrderStatusResponse)
@@ -318,12 +448,12 @@ async def get_order_status(order_id: str):
     if not status:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return OrderStatusResponse(
+    return json_response(OrderStatusResponse.model_construct(
         order_id=status.order_id,
         status=status.status.value,
         message=status.message,
         estimated_ready=status.estimated_ready.isoformat() if status.estimated_ready else None
-    )
+    ))
 
 
 @app.delete("/v1/orders/{order_id}")
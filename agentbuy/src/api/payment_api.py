@@ -4,16 +4,19 @@ AgentBuy - Voice Payment Demo API
 Simplified API for the voice-to-payment demo.
 """
 import logging
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 from typing import Optional
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from src.api.responses import json_response
+
+if not os.getenv("AGENTBUY_NO_DOTENV"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,11 +29,19 @@ payment_agent = None
 async def lifespan(app: FastAPI):
     """Initialize payment agent."""
     global payment_agent
+    from src.agent.llm import close_http_client
     from src.agent.payment_demo import PaymentDemoAgent
     
     payment_agent = PaymentDemoAgent()
     logger.info("Payment Demo API initialized")
-    yield
+    # Every step runs, newest first, even if an earlier one raises
+    async with AsyncExitStack() as cleanup:
+        cleanup.push_async_callback(close_http_client)
+        cleanup.push_async_callback(payment_agent.aclose)
+        try:
+            yield
+        finally:
+            payment_agent = None
     logger.info("Payment Demo API shutdown")
 
 
@@ -88,7 +99,7 @@ async def process_payment(request: PaymentRequest):
         user_id=request.user_id
     )
     
-    return PaymentResponse(
+    return json_response(PaymentResponse.model_construct(
         success=result.get("success", False),
         message=result.get("message", result.get("error", "Unknown error")),
         amount=result.get("amount"),
@@ -97,7 +108,7 @@ async def process_payment(request: PaymentRequest):
         payment_id=result.get("payment_id"),
         steps=result.get("steps"),
         error=result.get("error")
-    )
+    ))
 
 
 @app.post("/v1/voice-pay", response_model=PaymentResponse)
@@ -119,7 +130,7 @@ async def process_voice_payment(
         user_id=user_id
     )
     
-    return PaymentResponse(
+    return json_response(PaymentResponse.model_construct(
         success=result.get("success", False),
         message=result.get("message", result.get("error", "Unknown error")),
         amount=result.get("amount"),
@@ -128,7 +139,7 @@ async def process_voice_payment(
         payment_id=result.get("payment_id"),
         steps=result.get("steps"),
         error=result.get("error")
-    )
+    ))
 
 
 @app.get("/v1/demo-scenarios")
@@ -0,0 +1,31 @@
+"""
+AgentBuy - API Responses
+
+Helpers for returning response models without FastAPI's second
+validation pass.
+"""
+from fastapi import Response
+from pydantic import BaseModel
+
+
+def json_response(model: BaseModel, status_code: int = 200) -> Response:
+    """
+    Serialize a response model straight to a JSON response.
+    
+    FastAPI returns Response objects as-is, so the route's response_model is
+    still used for the OpenAPI schema but isn't re-validated per request.
+    Build the model with model_construct() to skip validation entirely for
+    data the handler assembled itself.
+    
+    Args:
+        model: The response model instance
+        status_code: HTTP status code
+        
+    Returns:
+        JSON response with the model's serialized fields
+    """
+    return Response(
+        content=model.model_dump_json(),
+        media_type="application/json",
+        status_code=status_code
+    )
@@ -3,17 +3,51 @@ AgentBuy - ReAct Reasoning Engine
 
 Implements the Think → Act → Observe loop for autonomous decision making.
 """
-import json
+import asyncio
+import inspect
 import logging
+import time
+import uuid
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Callable, Optional
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Literal, Mapping, Optional
 
-from openai import AsyncOpenAI
+import orjson
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
+# Streamed deltas are handed on in batches: whichever comes first
+STREAM_BATCH_INTERVAL = 0.2  # seconds
+STREAM_BATCH_CHUNKS = 16
+
+# The prompt carries the most recent steps verbatim; older ones are folded
+# into a running summary by a cheaper model
+HISTORY_WINDOW = 5
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Tools with no side effects, which may be run speculatively and discarded
+SAFE_READONLY_TOOLS = frozenset({
+    "starbucks_search_menu",
+    "starbucks_estimate_price",
+    "starbucks_get_order_status",
+    "get_user_preferences",
+    "get_user_location",
+    "get_current_time",
+    "search_nearby",
+    "auth_check_budget",
+    "auth_get_spending_summary",
+})
+
+_PREFETCH_INSTRUCTION = (
+    "\n\nIn \"prefetch\", list read-only tool calls you expect to need in "
+    "the next step, or null."
+)
+
 
 class ThoughtType(Enum):
     """Types of thoughts the agent can have."""
@@ -32,7 +66,13 @@ class Thought:
     next_action: Optional[str] = None
     action_input: Optional[dict] = None
     confidence: float = 0.8
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    prefetch: Optional[list["ToolCallOut"]] = None
+    timestamp_ns: int = field(default_factory=time.time_ns)
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Wall-clock time the thought was created (UTC), built on demand."""
+        return datetime.fromtimestamp(self.timestamp_ns / 1e9, timezone.utc)
     
     @property
     def is_complete(self) -> bool:
@@ -67,7 +107,7 @@ class AgentStep:
         if self.action:
             parts.append(f"Action: {self.action}")
             if self.action_input:
-                parts.append(f"Action Input: {json.dumps(self.action_input)}")
+                parts.append(f"Action Input: {orjson.dumps(self.action_input).decode()}")
         if self.observation:
             parts.append(f"Observation: {self.observation}")
         return "\n".join(parts)
@@ -82,6 +122,14 @@ class AgentContext:
     steps: list[AgentStep] = field(default_factory=list)
     memory: dict = field(default_factory=dict)
     max_steps: int = 15
+    # Each step's message, rendered once when the step is added
+    _history_parts: list[str] = field(default_factory=list, repr=False)
+    # System prompt up to the step history, rendered once per run
+    _prompt_prefix: str = field(default="", repr=False)
+    # Summary of the first _summarized steps, which get_history leaves out
+    _summary: str = field(default="", repr=False)
+    _summarized: int = field(default=0, repr=False)
+    _summary_task: Optional[asyncio.Task] = field(default=None, repr=False)
     
     def add_step(self, thought: Thought, action: str = None, 
                  action_input: dict = None, observation: str = None):
@@ -93,13 +141,46 @@ class AgentContext:
             observation=observation
         )
         self.steps.append(step)
+        self._history_parts.append(step.to_message())
         return step
     
     def get_history(self) -> str:
-        """Get reasoning history for LLM context."""
-        if not self.steps:
-            return "No previous steps."
-        return "\n\n".join(step.to_message() for step in self.steps)
+        """
+        Get reasoning history for LLM context.
+        
+        Steps already folded into the summary are replaced by it; the rest,
+        at least the last HISTORY_WINDOW, are included verbatim.
+        """
+        recent = "\n\n".join(self._history_parts[self._summarized:])
+        if self._summary:
+            return f"Summary of earlier steps: {self._summary}\n\n{recent}"
+        return recent or "No previous steps."
+
+
+class ToolCallOut(BaseModel):
+    """A tool call as returned by the model."""
+    action: str
+    # Structured outputs only allow closed objects, so free-form tool
+    # arguments travel as a JSON-encoded string
+    action_input: Optional[str] = Field(description="JSON object of tool arguments")
+
+
+class ThoughtOut(BaseModel):
+    """Schema the model's reply is constrained to."""
+    thought: str
+    thought_type: Literal["reasoning", "decision", "complete", "error"]
+    action: Optional[str]
+    action_input: Optional[str] = Field(description="JSON object of tool arguments")
+    confidence: float
+
+
+class SpeculativeThoughtOut(ThoughtOut):
+    """ThoughtOut plus the read-only calls to run ahead of the next step."""
+    prefetch: Optional[list[ToolCallOut]]
+
+
+def _tool_arguments(action_input: Optional[str]) -> Optional[dict]:
+    return orjson.loads(action_input) if action_input else None
 
 
 REACT_SYSTEM_PROMPT = """You are an autonomous AI agent that helps users make purchases.
@@ -118,7 +199,7 @@ Always respond in this exact JSON format:
     "thought": "Your reasoning about what to do next",
     "thought_type": "reasoning|decision|complete|error",
     "action": "tool_name or null if complete",
-    "action_input": {"param": "value"} or null,
+    "action_input": "{\\"param\\": \\"value\\"}" (JSON-encoded string) or null,
     "confidence": 0.0-1.0
 }
 
@@ -129,6 +210,7 @@ Always respond in this exact JSON format:
 4. If unsure, ask for clarification via the ask_user tool
 5. Always check authorization before making purchases
 6. If you encounter an error, try to recover or explain why you can't
+7. To find what you can click or fill on a page, use browser_extract_actions; fall back to browser_analyze_page only when that listing isn't enough (e.g. the page is mostly images or canvas)
 
 ## Current Context
 User ID: {user_id}
@@ -143,6 +225,15 @@ Goal: {goal}
 
 What is your next thought and action?"""
 
+# Everything but the history is fixed for a run, so the prompt is rendered as
+# a per-run prefix plus the history plus this constant tail. str.replace is
+# used rather than format() because the prompt contains literal JSON braces.
+_PROMPT_HEAD, _PROMPT_TAIL = REACT_SYSTEM_PROMPT.split("{history}")
+
+
+def _call_key(action: str, action_input: dict) -> tuple[str, bytes]:
+    return action, orjson.dumps(action_input, option=orjson.OPT_SORT_KEYS)
+
 
 class ReActEngine:
     """
@@ -155,67 +246,184 @@ class ReActEngine:
     
     def __init__(
         self,
-        llm_client: AsyncOpenAI,
-        tools: dict[str, Callable],
-        model: str = "gpt-4o"
+        llm_client: "AsyncOpenAI",
+        tools: Mapping[str, Callable],
+        model: str = "gpt-4o",
+        summary_model: str = SUMMARY_MODEL,
+        history_window: int = HISTORY_WINDOW,
+        speculative: bool = False
     ):
         self.llm = llm_client
         self.tools = tools
         self.model = model
+        self.summary_model = summary_model
+        self.history_window = history_window
+        # Speculative mode asks the model for likely next read-only calls and
+        # runs them while the next think() is in flight
+        self.speculative = speculative
+        self._user_prompt = "What is your next thought and action?"
+        self._response_format = ThoughtOut
+        if speculative:
+            self._user_prompt += _PREFETCH_INSTRUCTION
+            self._response_format = SpeculativeThoughtOut
+        # The tool set is fixed after construction, so parse docstrings and
+        # describe it once
+        self._tool_first_line = {
+            name: (tool.__doc__ or "No description").strip().split("\n", 1)[0]
+            for name, tool in tools.items()
+        }
+        self._tools_desc = self._get_tools_description()
     
     def _get_tools_description(self) -> str:
         """Generate tools description for the prompt."""
-        descriptions = []
-        for name, tool in self.tools.items():
-            doc = tool.__doc__ or "No description"
-            descriptions.append(f"- {name}: {doc.strip().split(chr(10))[0]}")
-        return "\n".join(descriptions)
-    
-    async def think(self, context: AgentContext) -> Thought:
-        """Generate the next thought based on current context."""
-        prompt = REACT_SYSTEM_PROMPT.format(
-            user_id=context.user_id,
-            session_id=context.session_id,
-            goal=context.goal,
-            tools_description=self._get_tools_description(),
-            history=context.get_history()
+        return "\n".join(
+            f"- {name}: {line}" for name, line in self._tool_first_line.items()
         )
+    
+    async def think(
+        self,
+        context: AgentContext,
+        on_delta: Callable[[str], Awaitable[None]] = None,
+        stream_batch_interval: float = STREAM_BATCH_INTERVAL
+    ) -> Thought:
+        """
+        Generate the next thought based on current context.
         
-        try:
-            response = await self.llm.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": "What is your next thought and action?"}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.2,
-                max_tokens=1000
+        Args:
+            context: The reasoning context
+            on_delta: Optional callback for the raw model output as it streams
+            stream_batch_interval: Longest time deltas are held before on_delta
+        """
+        if not context._prompt_prefix:
+            context._prompt_prefix = (
+                _PROMPT_HEAD
+                .replace("{tools_description}", self._tools_desc)
+                .replace("{user_id}", context.user_id)
+                .replace("{session_id}", context.session_id)
+                .replace("{goal}", context.goal)  # last: user text is never rescanned
             )
+        prompt = context._prompt_prefix + context.get_history() + _PROMPT_TAIL
+        
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": self._user_prompt}
+            ],
+            "response_format": self._response_format,
+            "temperature": 0.2,
+            "max_tokens": 1000
+        }
+        
+        try:
+            if on_delta is None:
+                response = await self.llm.chat.completions.parse(**request)
+                message = response.choices[0].message
+            else:
+                message = await self._stream_content(request, on_delta, stream_batch_interval)
             
-            result = json.loads(response.choices[0].message.content)
-            
-            thought_type = ThoughtType(result.get("thought_type", "reasoning"))
+            result = message.parsed
+            if result is None:
+                raise ValueError(message.refusal or "No structured reply")
             
             return Thought(
-                type=thought_type,
-                content=result.get("thought", ""),
-                next_action=result.get("action"),
-                action_input=result.get("action_input"),
-                confidence=result.get("confidence", 0.8)
+                type=ThoughtType(result.thought_type),
+                content=result.thought,
+                next_action=result.action,
+                action_input=_tool_arguments(result.action_input),
+                confidence=result.confidence,
+                prefetch=getattr(result, "prefetch", None)
             )
             
         except Exception as e:
-            logger.error(f"Error in think phase: {e}")
+            logger.error("Error in think phase: %s", e)
             return Thought(
                 type=ThoughtType.ERROR,
                 content=f"Failed to reason: {str(e)}",
                 confidence=0.0
             )
     
+    async def _stream_content(
+        self,
+        request: dict,
+        on_delta: Callable[[str], Awaitable[None]],
+        interval: float
+    ):
+        """Stream a structured completion, passing deltas to on_delta in batches."""
+        pending: list[str] = []
+        last_flush = time.monotonic()
+        
+        async with self.llm.chat.completions.stream(**request) as stream:
+            async for event in stream:
+                if event.type != "content.delta":
+                    continue
+                pending.append(event.delta)
+                
+                if len(pending) >= STREAM_BATCH_CHUNKS or time.monotonic() - last_flush >= interval:
+                    await on_delta("".join(pending))
+                    pending.clear()
+                    last_flush = time.monotonic()
+            
+            if pending:
+                await on_delta("".join(pending))
+            completion = await stream.get_final_completion()
+        return completion.choices[0].message
+    
+    def _maybe_summarize(self, context: AgentContext):
+        """Fold steps that left the history window into the summary, in the background."""
+        if context._summary_task and not context._summary_task.done():
+            return
+        end = len(context._history_parts) - self.history_window
+        if end <= context._summarized:
+            return
+        context._summary_task = asyncio.create_task(self._summarize(context, end))
+    
+    async def _summarize(self, context: AgentContext, end: int):
+        """Merge steps up to end into context._summary."""
+        steps = "\n\n".join(context._history_parts[context._summarized:end])
+        try:
+            response = await self.llm.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": (
+                            "Condense an agent's reasoning steps into a short summary. "
+                            "Keep tool results, amounts, IDs and authorization codes."
+                        )
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Summary so far: {context._summary or 'none'}\n\nNew steps:\n{steps}"
+                    }
+                ],
+                temperature=0,
+                max_tokens=300
+            )
+        except Exception as e:
+            # The steps stay in the prompt verbatim until a later attempt succeeds
+            logger.warning("History summarization failed: %s", e)
+            return
+        context._summary = response.choices[0].message.content.strip()
+        context._summarized = end
+    
+    def _start_prefetch(self, thought: Thought) -> dict[tuple, asyncio.Task]:
+        """Launch the thought's suggested read-only calls as background tasks."""
+        tasks = {}
+        for call in thought.prefetch or ():
+            if call.action not in SAFE_READONLY_TOOLS:
+                continue
+            try:
+                action_input = _tool_arguments(call.action_input) or {}
+            except orjson.JSONDecodeError:
+                continue
+            key = _call_key(call.action, action_input)
+            if key not in tasks:
+                tasks[key] = asyncio.create_task(self.act(call.action, action_input))
+        return tasks
+    
     async def act(self, action: str, action_input: dict) -> ActionResult:
         """Execute an action using the appropriate tool."""
-        import time
         start = time.time()
         
         if action not in self.tools:
@@ -226,7 +434,10 @@ class ReActEngine:
         
         try:
             tool = self.tools[action]
-            result = await tool(**(action_input or {}))
+            result = tool(**(action_input or {}))
+            # Tools that need no I/O may be plain functions
+            if inspect.isawaitable(result):
+                result = await result
             
             return ActionResult(
                 success=True,
@@ -235,7 +446,7 @@ class ReActEngine:
             )
             
         except Exception as e:
-            logger.error(f"Error executing {action}: {e}")
+            logger.error("Error executing %s: %s", action, e)
             return ActionResult(
                 success=False,
                 error=str(e),
@@ -246,75 +457,113 @@ class ReActEngine:
         """Convert action result to observation string."""
         if result.success:
             if isinstance(result.data, dict):
-                return json.dumps(result.data, indent=2)
+                return orjson.dumps(
+                    result.data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                ).decode()
             return str(result.data)
         else:
             return f"ERROR: {result.error}"
     
-    async def run(self, goal: str, user_id: str, session_id: str = None) -> dict:
+    async def run(
+        self,
+        goal: str,
+        user_id: str,
+        session_id: str = None,
+        on_delta: Callable[[str], Awaitable[None]] = None,
+        stream_batch_interval: float = STREAM_BATCH_INTERVAL
+    ) -> dict:
         """
         Run the full ReAct loop until goal is achieved or max steps reached.
         
+        Args:
+            goal: What the user wants done
+            user_id: The user's ID
+            session_id: Optional session ID (generated if omitted)
+            on_delta: Optional callback for each thought's output as it streams
+            stream_batch_interval: Longest time deltas are held before on_delta
+        
         Returns:
             dict with success status, final result, and reasoning trace
         """
-        import uuid
-        
         context = AgentContext(
             goal=goal,
             user_id=user_id,
             session_id=session_id or str(uuid.uuid4())
         )
         
-        logger.info(f"Starting ReAct loop for goal: {goal}")
+        logger.info("Starting ReAct loop for goal: %s", goal)
+        prefetched: dict[tuple, asyncio.Task] = {}
         
-        for step_num in range(context.max_steps):
-            logger.info(f"Step {step_num + 1}/{context.max_steps}")
-            
-            # THINK
-            thought = await self.think(context)
-            logger.info(f"Thought: {thought.content[:100]}...")
-            
-            if thought.is_complete:
-                context.add_step(thought)
-                return {
-                    "success": True,
-                    "result": thought.content,
-                    "steps": len(context.steps),
-                    "trace": [s.to_message() for s in context.steps]
-                }
-            
-            if thought.is_error:
-                context.add_step(thought)
-                return {
-                    "success": False,
-                    "error": thought.content,
-                    "steps": len(context.steps),
-                    "trace": [s.to_message() for s in context.steps]
-                }
-            
-            # ACT
-            if thought.next_action:
-                logger.info(f"Action: {thought.next_action}")
-                result = await self.act(thought.next_action, thought.action_input)
+        try:
+            for step_num in range(context.max_steps):
+                logger.info("Step %d/%d", step_num + 1, context.max_steps)
                 
-                # OBSERVE
-                observation = await self.observe(result)
-                logger.info(f"Observation: {observation[:100]}...")
+                # THINK
+                thought = await self.think(context, on_delta, stream_batch_interval)
+                # %.100s truncates at format time, so nothing is sliced when INFO is off
+                logger.info("Thought: %.100s...", thought.content)
                 
-                context.add_step(
-                    thought=thought,
-                    action=thought.next_action,
-                    action_input=thought.action_input,
-                    observation=observation
-                )
-            else:
-                context.add_step(thought)
-        
-        # Max steps reached
-        return {
-            "success": False,
-            "error": f"Max steps ({context.max_steps}) reached without completing goal",
-            "steps": len(context.steps),
-            "trace": [s.to_message() for s in context.steps]
-        }
+                if thought.is_complete:
+                    context.add_step(thought)
+                    return {
+                        "success": True,
+                        "result": thought.content,
+                        "steps": len(context.steps),
+                        "trace": list(context._history_parts)
+                    }
+                
+                if thought.is_error:
+                    context.add_step(thought)
+                    return {
+                        "success": False,
+                        "error": thought.content,
+                        "steps": len(context.steps),
+                        "trace": list(context._history_parts)
+                    }
+                
+                # ACT, reusing a speculative call if the model asked for it
+                if thought.next_action:
+                    logger.info("Action: %s", thought.next_action)
+                    speculated = prefetched.pop(
+                        _call_key(thought.next_action, thought.action_input or {}), None
+                    )
+                    for task in prefetched.values():
+                        task.cancel()
+                    # Prefetches may overlap a read-only action, but must not
+                    # observe state from before one that changes something
+                    read_only = thought.next_action in SAFE_READONLY_TOOLS
+                    prefetched = self._start_prefetch(thought) if read_only else {}
+                    if speculated:
+                        result = await speculated
+                    else:
+                        result = await self.act(thought.next_action, thought.action_input)
+                    if not read_only:
+                        prefetched = self._start_prefetch(thought)
+                    
+                    # OBSERVE
+                    observation = await self.observe(result)
+                    logger.info("Observation: %.100s...", observation)
+                    
+                    context.add_step(
+                        thought=thought,
+                        action=thought.next_action,
+                        action_input=thought.action_input,
+                        observation=observation
+                    )
+                else:
+                    context.add_step(thought)
+                self._maybe_summarize(context)
+            
+            # Max steps reached
+            return {
+                "success": False,
+                "error": f"Max steps ({context.max_steps}) reached without completing goal",
+                "steps": len(context.steps),
+                "trace": list(context._history_parts)
+            }
+        finally:
+            if context._summary_task:
+                context._summary_task.cancel()
+            for task in prefetched.values():
+                task.cancel()
@@ -0,0 +1,98 @@
+/*
+ * AgentBuy - Playwright Worker
+ *
+ * One long-lived Chromium driven from Node.js. Commands arrive as JSON lines
+ * on stdin ({"id", "cmd", ...params}) and each reply is a JSON line on stdout
+ * carrying the same id and either "result" or "error". Commands run
+ * concurrently, each in its own browser context.
+ *
+ * Dependencies are declared in the package.json next to this file; install
+ * them with `npm install --prefix src/connectors` (see the README).
+ */
+const readline = require("readline");
+
+let chromium;
+try {
+  ({ chromium } = require("playwright"));
+} catch (err) {
+  process.stderr.write(
+    "Playwright worker: the playwright npm package is missing; " +
+      "run `npm install --prefix src/connectors`\n"
+  );
+  process.exit(1);
+}
+
+let browserPromise = null;
+
+function getBrowser() {
+  if (!browserPromise) {
+    browserPromise = chromium.launch({ headless: true });
+  }
+  return browserPromise;
+}
+
+async function login({ url, email, password, storageState }) {
+  const browser = await getBrowser();
+  const context = await browser.newContext(storageState ? { storageState } : {});
+  try {
+    const page = await context.newPage();
+
+    await page.goto(url, { waitUntil: "commit" });
+    await page.waitForLoadState("domcontentloaded");
+
+    await page.waitForSelector('input[name="username"]', { state: "attached" });
+    await page.fill('input[name="username"]', email);
+    await page.waitForSelector('input[name="password"]', { state: "attached" });
+    await page.fill('input[name="password"]', password);
+
+    // The sign-in page is already loaded, so wait for the one submit leads to
+    await Promise.all([
+      page.waitForNavigation({ waitUntil: "domcontentloaded" }),
+      page.click('button[type="submit"]'),
+    ]);
+
+    const authenticated = page.url().toLowerCase().includes("account");
+    return {
+      authenticated,
+      storageState: authenticated ? await context.storageState() : null,
+    };
+  } finally {
+    await context.close();
+  }
+}
+
+const handlers = { login };
+
+const rl = readline.createInterface({ input: process.stdin });
+
+rl.on("line", async (line) => {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (err) {
+    return;
+  }
+
+  const reply = { id: message.id };
+  try {
+    const handler = handlers[message.cmd];
+    if (!handler) {
+      throw new Error(`Unknown command: ${message.cmd}`);
+    }
+    reply.result = await handler(message);
+  } catch (err) {
+    reply.error = String((err && err.message) || err);
+  }
+  process.stdout.write(JSON.stringify(reply) + "\n");
+});
+
+// stdin closing means the Python side is shutting down
+rl.on("close", async () => {
+  if (browserPromise) {
+    const browser = await browserPromise.catch(() => null);
+    if (browser) {
+      await browser.close();
+    }
+  }
+  process.exit(0);
+});
@@ -3,13 +3,19 @@ AgentBuy - Base Platform Connector
 
 Abstract interface for all platform integrations.
 """
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Optional
 
 
+def utc_now() -> datetime:
+    """Current time as an aware UTC datetime."""
+    return datetime.now(timezone.utc)
+
+
 class OrderStatusEnum(Enum):
     """Possible order statuses."""
     PENDING = "pending"
@@ -23,7 +29,7 @@ class OrderStatusEnum(Enum):
     FAILED = "failed"
 
 
-@dataclass
+@dataclass(slots=True, kw_only=True)
 class Item:
     """Represents an item to purchase."""
     name: str
@@ -35,9 +41,18 @@ class Item:
     @property
     def total_price(self) -> float:
         return self.price * self.quantity
+    
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "price": self.price,
+            "quantity": self.quantity,
+            "size": self.size,
+            "customizations": list(self.customizations)
+        }
 
 
-@dataclass
+@dataclass(slots=True, kw_only=True)
 class Order:
     """Represents a placed order."""
     order_id: str
@@ -45,24 +60,40 @@ class Order:
     items: list[Item]
     total_price: float
     status: OrderStatusEnum = OrderStatusEnum.PENDING
-    created_at: datetime = field(default_factory=datetime.utcnow)
+    created_at: datetime = field(default_factory=utc_now)
     estimated_ready: Optional[datetime] = None
     pickup_location: Optional[str] = None
     tracking_url: Optional[str] = None
+    # Monotonic creation time, for cheap elapsed-time checks
+    created_mono: float = field(default_factory=time.monotonic, repr=False, compare=False)
     
     @property
     def summary(self) -> str:
         item_names = ", ".join(i.name for i in self.items)
         return f"{item_names} from {self.platform} - ${self.total_price:.2f}"
+    
+    def to_dict(self) -> dict:
+        """JSON-ready mapping, built directly rather than via dataclasses.asdict."""
+        return {
+            "order_id": self.order_id,
+            "platform": self.platform,
+            "items": [item.to_dict() for item in self.items],
+            "total_price": self.total_price,
+            "status": self.status.value,
+            "created_at": self.created_at.isoformat(),
+            "estimated_ready": self.estimated_ready.isoformat() if self.estimated_ready else None,
+            "pickup_location": self.pickup_location,
+            "tracking_url": self.tracking_url
+        }
 
 
-@dataclass
+@dataclass(slots=True, kw_only=True)
 class OrderStatus:
     """Status update for an order."""
     order_id: str
     status: OrderStatusEnum
     message: str
-    updated_at: datetime = field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=utc_now)
     estimated_ready: Optional[datetime] = None
 
 
@@ -125,6 +156,19 @@ class PlatformConnector(ABC):
         """
         pass
     
+    def search_items_sync(self, query: str, **kwargs) -> list[Item]:
+        """
+        Synchronous search_items for platforms that answer without I/O.
+        
+        Platforms with a local catalog override this (and have search_items
+        return it) so synchronous callers skip the coroutine machinery.
+        """
+        raise NotImplementedError(f"{self.platform_name} has no synchronous search")
+    
+    def estimate_price_sync(self, items: list[dict]) -> float:
+        """Synchronous estimate_price; see search_items_sync."""
+        raise NotImplementedError(f"{self.platform_name} has no synchronous price estimate")
+    
     @abstractmethod
     async def create_order(
         self,
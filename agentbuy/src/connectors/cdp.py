@@ -0,0 +1,293 @@
+"""
+AgentBuy - Chrome DevTools Protocol Driver
+
+A minimal CDP client for the short form flows connectors automate (open a
+page, fill inputs, click). It drives Chromium over one WebSocket, without
+Playwright's driver process and per-call bookkeeping in between.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import orjson
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+_CHROMIUM_NAMES = ("chromium", "chromium-browser", "google-chrome", "google-chrome-stable")
+
+# Cookie fields Storage.setCookies accepts
+_COOKIE_PARAMS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+_FOCUS_JS = """(sel) => {
+    const el = document.querySelector(sel);
+    if (!el) return false;
+    el.focus();
+    if ("select" in el) el.select();
+    return true;
+}"""
+
+_CENTER_JS = """(sel) => {
+    const el = document.querySelector(sel);
+    if (!el) return null;
+    el.scrollIntoView({block: "center"});
+    const r = el.getBoundingClientRect();
+    return {x: r.x + r.width / 2, y: r.y + r.height / 2};
+}"""
+
+
+class CDPError(Exception):
+    """A CDP command failed or the browser went away."""
+
+
+def _find_chromium() -> str:
+    path = os.getenv("CHROMIUM_PATH")
+    if path:
+        return path
+    for name in _CHROMIUM_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise CDPError("Chromium not found; set CHROMIUM_PATH")
+
+
+def _call_js(function: str, *args) -> str:
+    """Build an expression calling a JS function with JSON-encoded arguments."""
+    return f"({function})({', '.join(orjson.dumps(a).decode() for a in args)})"
+
+
+class CDPBrowser:
+    """
+    One headless Chromium and the browser-level CDP connection.
+
+    Pages are opened in their own browser context and share the connection;
+    messages are routed by CDP session id.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, ws, user_data_dir: str):
+        self._process = process
+        self._ws = ws
+        self._user_data_dir = user_data_dir
+        self._last_id = 0
+        self._pending: dict[int, asyncio.Future] = {}
+        self._waiters: dict[tuple[str, Optional[str]], list[asyncio.Future]] = {}
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def launch(cls, headless: bool = True, timeout: float = 30.0) -> "CDPBrowser":
+        """Start Chromium with remote debugging on a free port and connect."""
+        user_data_dir = tempfile.mkdtemp(prefix="agentbuy-cdp-")
+        args = [
+            _find_chromium(),
+            "--remote-debugging-port=0",
+            f"--user-data-dir={user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+        ]
+        if headless:
+            args.append("--headless=new")
+        process = await asyncio.create_subprocess_exec(
+            *args, "about:blank",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+
+        # Chromium writes the chosen port and browser path once it is listening
+        port_file = os.path.join(user_data_dir, "DevToolsActivePort")
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not os.path.exists(port_file) or os.path.getsize(port_file) == 0:
+            if process.returncode is not None or asyncio.get_running_loop().time() > deadline:
+                process.kill()
+                shutil.rmtree(user_data_dir, ignore_errors=True)
+                raise CDPError("Chromium did not open a DevTools port")
+            await asyncio.sleep(0.05)
+        with open(port_file) as f:
+            port, path = f.read().split()[:2]
+
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}{path}", max_size=None)
+        logger.info(f"Chromium CDP session opened on port {port}")
+        return cls(process, ws, user_data_dir)
+
+    @property
+    def is_connected(self) -> bool:
+        return not self._reader.done()
+
+    async def _read_loop(self):
+        """Resolve command replies and event waiters as messages arrive."""
+        try:
+            async for raw in self._ws:
+                message = orjson.loads(raw)
+                if "id" in message:
+                    future = self._pending.pop(message["id"], None)
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(CDPError(message["error"].get("message", "CDP error")))
+                    else:
+                        future.set_result(message.get("result", {}))
+                else:
+                    key = (message.get("method"), message.get("sessionId"))
+                    for future in self._waiters.pop(key, ()):
+                        if not future.done():
+                            future.set_result(message.get("params", {}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            error = CDPError("CDP connection closed")
+            waiters = [f for futures in self._waiters.values() for f in futures]
+            for future in [*self._pending.values(), *waiters]:
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            self._waiters.clear()
+
+    async def _cdp_call(self, method: str, params: dict = None, session_id: str = None) -> dict:
+        """
+        Send one CDP command and wait for its result.
+
+        Args:
+            method: CDP method, e.g. "Page.navigate"
+            params: Command parameters
+            session_id: Target session, or None for the browser itself
+        """
+        if not self.is_connected:
+            raise CDPError("CDP connection closed")
+        self._last_id += 1
+        message = {"id": self._last_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._last_id] = future
+        await self._ws.send(orjson.dumps(message).decode())
+        return await future
+
+    def expect_event(self, method: str, session_id: str = None) -> asyncio.Future:
+        """Get a future for the next such event; register before triggering it."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault((method, session_id), []).append(future)
+        return future
+
+    async def new_page(self, cookies: list[dict] = None) -> "CDPPage":
+        """Open a page in a fresh browser context, optionally seeded with cookies."""
+        context_id = (await self._cdp_call("Target.createBrowserContext"))["browserContextId"]
+        if cookies:
+            await self._cdp_call(
+                "Storage.setCookies",
+                {"cookies": cookies, "browserContextId": context_id}
+            )
+        target = await self._cdp_call(
+            "Target.createTarget",
+            {"url": "about:blank", "browserContextId": context_id}
+        )
+        attached = await self._cdp_call(
+            "Target.attachToTarget",
+            {"targetId": target["targetId"], "flatten": True}
+        )
+        page = CDPPage(self, attached["sessionId"], context_id)
+        await page.call("Page.enable")
+        return page
+
+    async def close(self):
+        """Close the connection and stop Chromium."""
+        try:
+            await self._cdp_call("Browser.close")
+        except CDPError:
+            pass
+        await self._ws.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self._process.kill()
+        shutil.rmtree(self._user_data_dir, ignore_errors=True)
+
+
+class CDPPage:
+    """A page in its own browser context, with the few actions connectors need."""
+
+    def __init__(self, browser: CDPBrowser, session_id: str, context_id: str):
+        self.browser = browser
+        self.session_id = session_id
+        self.context_id = context_id
+
+    async def call(self, method: str, params: dict = None) -> dict:
+        return await self.browser._cdp_call(method, params, self.session_id)
+
+    async def evaluate(self, expression: str):
+        """Evaluate JavaScript in the page and return its JSON value."""
+        result = await self.call(
+            "Runtime.evaluate",
+            {"expression": expression, "returnByValue": True, "awaitPromise": True}
+        )
+        if "exceptionDetails" in result:
+            raise CDPError(result["exceptionDetails"].get("text", "JavaScript error"))
+        return result["result"].get("value")
+
+    def expect_navigation(self) -> asyncio.Future:
+        """Future resolved when the next document's DOM is ready."""
+        return self.browser.expect_event("Page.domContentEventFired", self.session_id)
+
+    async def goto(self, url: str, timeout: float = 30.0):
+        """Navigate and wait for DOMContentLoaded."""
+        loaded = self.expect_navigation()
+        result = await self.call("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            loaded.cancel()
+            raise CDPError(f"Navigation to {url} failed: {result['errorText']}")
+        await asyncio.wait_for(loaded, timeout)
+
+    async def wait_for_selector(self, selector: str, timeout: float = 30.0):
+        """Poll until an element matching selector is in the DOM."""
+        expression = _call_js("(sel) => document.querySelector(sel) !== null", selector)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not await self.evaluate(expression):
+            if asyncio.get_running_loop().time() > deadline:
+                raise CDPError(f"Timed out waiting for {selector}")
+            await asyncio.sleep(0.05)
+
+    async def fill(self, selector: str, value: str):
+        """Focus an input, select its contents and type over them."""
+        if not await self.evaluate(_call_js(_FOCUS_JS, selector)):
+            raise CDPError(f"No element matches {selector}")
+        # insertText goes through the browser's input pipeline, so frameworks
+        # that track input events see the change
+        await self.call("Input.insertText", {"text": value})
+
+    async def click(self, selector: str):
+        """Click the centre of an element with real mouse events."""
+        point = await self.evaluate(_call_js(_CENTER_JS, selector))
+        if not point:
+            raise CDPError(f"No element matches {selector}")
+        for event in ("mousePressed", "mouseReleased"):
+            await self.call("Input.dispatchMouseEvent", {
+                "type": event,
+                "x": point["x"],
+                "y": point["y"],
+                "button": "left",
+                "clickCount": 1
+            })
+
+    async def url(self) -> str:
+        return await self.evaluate("location.href")
+
+    async def cookies(self) -> list[dict]:
+        """This context's cookies, in the shape new_page() accepts."""
+        result = await self.browser._cdp_call(
+            "Storage.getCookies", {"browserContextId": self.context_id}
+        )
+        return [
+            {k: c[k] for k in _COOKIE_PARAMS if k in c and not (k == "expires" and c[k] <= 0)}
+            for c in result.get("cookies", [])
+        ]
+
+    async def close(self):
+        """Dispose of the page's browser context."""
+        try:
+            await self.browser._cdp_call(
+                "Target.disposeBrowserContext", {"browserContextId": self.context_id}
+            )
+        except CDPError as e:
+            logger.warning(f"Failed to close CDP context: {e}")
@@ -0,0 +1,101 @@
+"""
+AgentBuy - Node.js Playwright Worker Client
+
+Runs browser automation in a long-lived Node.js Playwright process
+(_pw_worker.js) and talks to it over stdin/stdout JSON lines. Node drives
+Chromium in-process, so the Python side only pays for one small message per
+command rather than Playwright's per-call client/server marshalling.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "_pw_worker.js")
+
+# Replies can carry a full storage state, well past asyncio's 64KB line default
+_LINE_LIMIT = 16 * 1024 * 1024
+
+
+class WorkerError(Exception):
+    """A worker command failed or the worker exited."""
+
+
+class PlaywrightWorker:
+    """A Node.js Playwright process shared by every caller."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self._process = process
+        self._last_id = 0
+        self._pending: dict[int, asyncio.Future] = {}
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def start(cls, node: str = None) -> "PlaywrightWorker":
+        """Spawn the worker; Chromium launches on its first command."""
+        process = await asyncio.create_subprocess_exec(
+            node or "node", WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=_LINE_LIMIT
+        )
+        logger.info(f"Playwright worker started (pid {process.pid})")
+        return cls(process)
+
+    @property
+    def is_running(self) -> bool:
+        return not self._reader.done()
+
+    async def _read_loop(self):
+        """Resolve each command's future as its reply line arrives."""
+        try:
+            while line := await self._process.stdout.readline():
+                try:
+                    reply = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                future = self._pending.pop(reply.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in reply:
+                    future.set_exception(WorkerError(reply["error"]))
+                else:
+                    future.set_result(reply.get("result"))
+        finally:
+            error = WorkerError("Playwright worker exited")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def send_cmd(self, cmd: str, **params) -> Optional[dict]:
+        """
+        Run one worker command and wait for its result.
+
+        Args:
+            cmd: Command name, e.g. "login"
+            **params: Command parameters
+        """
+        if not self.is_running:
+            raise WorkerError("Playwright worker exited")
+        self._last_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._last_id] = future
+        self._process.stdin.write(orjson.dumps({"id": self._last_id, "cmd": cmd, **params}) + b"\n")
+        await self._process.stdin.drain()
+        return await future
+
+    async def close(self):
+        """Close stdin so the worker shuts its browser down and exits."""
+        if self._process.stdin and not self._process.stdin.is_closing():
+            self._process.stdin.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            self._process.kill()
+        await self._reader
@@ -5,18 +5,213 @@ Integration with Starbucks mobile ordering.
 Uses browser automation as primary method with API fallback.
 """
 import asyncio
+import http.cookiejar
+import importlib.metadata
+import inspect
 import logging
+import os
 import re
+import time
+import traceback
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional
+from collections import defaultdict
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Optional
 
-from playwright.async_api import async_playwright, Browser, Page
+import httpx
 
-from .base import PlatformConnector, Item, Order, OrderStatus, OrderStatusEnum
+from src.tools.browser import BrowserContextPool
+
+from .base import PlatformConnector, Item, Order, OrderStatus, OrderStatusEnum, utc_now
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, BrowserContext, Page, Playwright
+
+    from .cdp import CDPBrowser
+    from .node_worker import PlaywrightWorker
 
 logger = logging.getLogger(__name__)
 
+SIGNIN_URL = "https://www.starbucks.com/account/signin"
+ACCOUNT_API_URL = "https://account.starbucks.com"
+
+# Order statuses are reused for this long, so clients polling in a loop or
+# concurrently share one lookup; ready orders no longer change
+STATUS_TTL_SECONDS = 2.0
+READY_STATUS_TTL_SECONDS = 30.0
+
+# "playwright" runs playwright-python in this process; "cdp" drives Chromium
+# directly over the DevTools protocol, and "node" hands browser work to a
+# Node.js Playwright worker process
+BROWSER_DRIVER = os.getenv("AGENTBUY_BROWSER_DRIVER", "playwright")
+
+# The Playwright release whose internals _disable_stack_capture patches;
+# other releases run unpatched
+PLAYWRIGHT_PATCHED_VERSION = "1.63"
+
+# Warm Playwright contexts kept for reuse between calls
+CONTEXT_POOL_SIZE = int(os.getenv("AGENTBUY_CONTEXT_POOL_SIZE", "8"))
+
+# One HTTP/2 pool for JSON logins. Its cookie policy refuses every cookie, so
+# one connector's session never rides along on another's request.
+_auth_client: Optional[httpx.AsyncClient] = None
+
+# One Chromium for every connector in the process; each call borrows its own
+# context, so concurrent calls don't share a tab or pay for a launch
+_browser_lock = asyncio.Lock()
+_playwright: Optional["Playwright"] = None
+_shared_browser: Optional["Browser"] = None
+_cdp_browser: Optional["CDPBrowser"] = None
+_node_worker: Optional["PlaywrightWorker"] = None
+_context_pool: Optional[BrowserContextPool] = None
+
+
+def _nearest_frame_stack_trace() -> dict:
+    """
+    Playwright's _capture_stack_trace, stopping at the first frame outside
+    Playwright instead of walking the whole stack.
+    
+    apiName is the outermost Playwright method before that frame, as
+    Playwright reports it, so errors still name the failing call.
+    """
+    from playwright._impl import _connection, _impl_to_api_mapping
+    frame = inspect.currentframe()
+    # Skip this helper and the wrap_api_call that asked for it
+    frame = frame.f_back.f_back if frame and frame.f_back else None
+    api_name = ""
+    while frame:
+        code = frame.f_code
+        if code.co_filename == _impl_to_api_mapping.__file__:
+            frame = frame.f_back
+            continue
+        method_name = code.co_name
+        if "self" in frame.f_locals:
+            method_name = f"{frame.f_locals['self'].__class__.__name__}.{method_name}"
+        if not code.co_filename.startswith(_connection._PLAYWRIGHT_MODULE_PATH):
+            return {
+                "frames": [{
+                    "file": code.co_filename,
+                    "line": frame.f_lineno,
+                    "column": 0,
+                    "function": method_name
+                }],
+                "apiName": api_name,
+                "title": None
+            }
+        api_name = method_name
+        frame = frame.f_back
+    return {"frames": [], "apiName": api_name, "title": None}
+
+
+def _disable_stack_capture():
+    """
+    Stop Playwright from walking the Python stack on every API call.
+    
+    Only the caller's frame is kept for trace metadata and error messages,
+    and the internal frames Playwright attaches to protocol errors are
+    dropped. Set PW_INSPECT_STACK=1 to keep full stacks.
+    """
+    from playwright._impl import _connection
+    version = importlib.metadata.version("playwright")
+    if not version.startswith(PLAYWRIGHT_PATCHED_VERSION + ".") or not hasattr(
+        _connection, "_capture_stack_trace"
+    ):
+        logger.warning(f"Playwright {version} internals not known; leaving stack capture on")
+        return
+    _connection._capture_stack_trace = _nearest_frame_stack_trace
+    _connection.traceback = SimpleNamespace(
+        StackSummary=traceback.StackSummary,
+        extract_stack=lambda limit=None: traceback.StackSummary(),
+        print_exception=traceback.print_exception
+    )
+
+
+def _get_auth_client() -> httpx.AsyncClient:
+    global _auth_client
+    if _auth_client is None or _auth_client.is_closed:
+        _auth_client = httpx.AsyncClient(
+            base_url=ACCOUNT_API_URL,
+            http2=True,
+            timeout=30.0,
+            cookies=http.cookiejar.CookieJar(
+                policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+            )
+        )
+    return _auth_client
+
+
+async def _get_browser() -> "Browser":
+    """Launch the shared browser on first use."""
+    global _playwright, _shared_browser
+    if _shared_browser is not None and _shared_browser.is_connected():
+        return _shared_browser
+    async with _browser_lock:
+        if _shared_browser is None or not _shared_browser.is_connected():
+            # Imported here so price estimates and demo orders skip loading Playwright
+            from playwright.async_api import async_playwright
+            if _playwright is None:
+                if os.getenv("PW_INSPECT_STACK", "0") == "0":
+                    _disable_stack_capture()
+                _playwright = await async_playwright().start()
+            _shared_browser = await _playwright.chromium.launch(headless=True)
+    return _shared_browser
+
+
+def _get_context_pool() -> BrowserContextPool:
+    global _context_pool
+    if _context_pool is None:
+        _context_pool = BrowserContextPool(_get_browser, size=CONTEXT_POOL_SIZE)
+    return _context_pool
+
+
+async def _get_cdp_browser() -> "CDPBrowser":
+    """Launch the shared CDP-driven browser on first use."""
+    global _cdp_browser
+    if _cdp_browser is not None and _cdp_browser.is_connected:
+        return _cdp_browser
+    async with _browser_lock:
+        if _cdp_browser is None or not _cdp_browser.is_connected:
+            from .cdp import CDPBrowser
+            _cdp_browser = await CDPBrowser.launch(headless=True)
+    return _cdp_browser
+
+
+async def _get_node_worker() -> "PlaywrightWorker":
+    """Start the shared Node.js Playwright worker on first use."""
+    global _node_worker
+    if _node_worker is not None and _node_worker.is_running:
+        return _node_worker
+    async with _browser_lock:
+        if _node_worker is None or not _node_worker.is_running:
+            from .node_worker import PlaywrightWorker
+            _node_worker = await PlaywrightWorker.start()
+    return _node_worker
+
+
+async def close_shared_browser():
+    """Close the shared browser and login client; call once at process shutdown."""
+    global _playwright, _shared_browser, _cdp_browser, _node_worker, _auth_client, _context_pool
+    if _auth_client is not None:
+        await _auth_client.aclose()
+        _auth_client = None
+    async with _browser_lock:
+        if _node_worker is not None:
+            await _node_worker.close()
+            _node_worker = None
+        if _cdp_browser is not None:
+            await _cdp_browser.close()
+            _cdp_browser = None
+        if _context_pool is not None:
+            await _context_pool.close()
+            _context_pool = None
+        if _shared_browser is not None:
+            await _shared_browser.close()
+            _shared_browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+
 
 # Starbucks menu items with normalized names and typical prices
 STARBUCKS_MENU = {
@@ -32,19 +227,63 @@ STARBUCKS_MENU = {
     "chai latte": {"base_price": 4.75, "sizes": {"tall": 0, "grande": 0.50, "venti": 1.00}},
 }
 
+# Word -> positions of the menu entries containing it. An item matches the
+# first entry, in menu order, that shares any word with its name.
+_MENU_INDEX: dict[str, list[int]] = defaultdict(list)
+for _position, _menu_name in enumerate(STARBUCKS_MENU):
+    for _word in set(_menu_name.split()):
+        _MENU_INDEX[_word].append(_position)
+_MENU_INDEX = dict(_MENU_INDEX)
+# Finds every menu word in an item name in one pass
+_MENU_WORD_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(map(re.escape, _MENU_INDEX), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+
+
+# Unit price of each entry by size, and for sizes the entry doesn't list
+_UNIT_PRICES = [
+    {size: info["base_price"] + upcharge for size, upcharge in info["sizes"].items()}
+    for info in STARBUCKS_MENU.values()
+]
+_OTHER_SIZE_PRICES = [info["base_price"] + 0.50 for info in STARBUCKS_MENU.values()]
+DEFAULT_ITEM_PRICE = 5.50
+
+
+def _match_menu(name: str) -> Optional[int]:
+    """Get the position of the menu entry matching name."""
+    positions = [
+        p for match in _MENU_WORD_RE.finditer(name) for p in _MENU_INDEX[match.group().lower()]
+    ]
+    return min(positions) if positions else None
+
+
+def _unit_price(name: str, size: str) -> float:
+    """Price of one item, before tax."""
+    position = _match_menu(name)
+    if position is None:
+        return DEFAULT_ITEM_PRICE
+    return _UNIT_PRICES[position].get(size, _OTHER_SIZE_PRICES[position])
+
 
 class StarbucksConnector(PlatformConnector):
     """
     Starbucks mobile ordering connector.
     
-    Uses Playwright for browser automation to place orders.
+    Logs in through the account JSON API. Browser login, for accounts that
+    get an MFA challenge, uses Playwright; see BROWSER_DRIVER for the
+    alternatives.
     """
     
     def __init__(self):
-        self.browser: Optional[Browser] = None
-        self.page: Optional[Page] = None
         self.authenticated = False
+        # Cookies from a successful login, replayed into each new context
+        self._storage_state: Optional[dict] = None  # Playwright and Node worker
+        self._cookies: Optional[list[dict]] = None  # CDP
         self.orders: dict[str, Order] = {}
+        # order_id -> (expires_at, status), and a lock per order for filling it
+        self._status_cache: dict[str, tuple[float, OrderStatus]] = {}
+        self._status_locks: dict[str, asyncio.Lock] = {}
     
     @property
     def platform_id(self) -> str:
@@ -54,45 +293,134 @@ class StarbucksConnector(PlatformConnector):
     def platform_name(self) -> str:
         return "Starbucks"
     
-    async def _ensure_browser(self):
-        """Ensure browser is initialized."""
-        if not self.browser:
-            playwright = await async_playwright().start()
-            self.browser = await playwright.chromium.launch(headless=True)
-            self.page = await self.browser.new_page()
+    async def _acquire_context(self) -> tuple["BrowserContext", "Page"]:
+        """Take a wiped context on the shared browser, logged in if we are."""
+        return await _get_context_pool().acquire(storage_state=self._storage_state)
     
     async def authenticate(self, credentials: dict) -> bool:
         """
         Authenticate with Starbucks account.
         
         Args:
-            credentials: {"email": "...", "password": "..."}
+            credentials: {"email": "...", "password": "..."}, plus
+                "mode": "browser" to log in through the web form
         """
-        await self._ensure_browser()
+        try:
+            if credentials.get("mode") != "browser":
+                self.authenticated = await self._authenticate_api(credentials)
+            elif BROWSER_DRIVER == "cdp":
+                self.authenticated = await self._authenticate_cdp(credentials)
+            elif BROWSER_DRIVER == "node":
+                self.authenticated = await self._authenticate_node(credentials)
+            else:
+                self.authenticated = await self._authenticate_playwright(credentials)
+        except Exception as e:
+            logger.error(f"Starbucks authentication failed: {e}")
+            self.authenticated = False
+        return self.authenticated
+    
+    async def _authenticate_api(self, credentials: dict) -> bool:
+        response = await _get_auth_client().post(
+            "/api/login",
+            json={"username": credentials["email"], "password": credentials["password"]}
+        )
+        if response.is_error:
+            logger.warning(f"Starbucks login rejected: HTTP {response.status_code}")
+            return False
+        
+        cookies = [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "secure": c.secure,
+                "httpOnly": c.has_nonstandard_attr("HttpOnly"),
+                "sameSite": "Lax",
+                "expires": c.expires or -1
+            }
+            for c in response.cookies.jar
+        ]
+        if not cookies:
+            # Accepted without a session, e.g. an MFA challenge
+            logger.warning("Starbucks login returned no session; retry with mode='browser'")
+            return False
+        
+        # Later browser work starts from the same session
+        self._cookies = [{k: v for k, v in c.items() if k != "expires" or v > 0} for c in cookies]
+        self._storage_state = {"cookies": cookies, "origins": []}
+        return True
+    
+    async def _authenticate_cdp(self, credentials: dict) -> bool:
+        browser = await _get_cdp_browser()
+        page = await browser.new_page(cookies=self._cookies)
+        
+        try:
+            await page.goto(SIGNIN_URL)
+            
+            await page.wait_for_selector('input[name="username"]')
+            await page.fill('input[name="username"]', credentials["email"])
+            await page.wait_for_selector('input[name="password"]')
+            await page.fill('input[name="password"]', credentials["password"])
+            
+            navigated = page.expect_navigation()
+            await page.click('button[type="submit"]')
+            await asyncio.wait_for(navigated, timeout=30)
+            
+            authenticated = "account" in (await page.url()).lower()
+            if authenticated:
+                self._cookies = await page.cookies()
+            return authenticated
+        finally:
+            await page.close()
+    
+    async def _authenticate_node(self, credentials: dict) -> bool:
+        worker = await _get_node_worker()
+        result = await worker.send_cmd(
+            "login",
+            url=SIGNIN_URL,
+            email=credentials["email"],
+            password=credentials["password"],
+            storageState=self._storage_state
+        )
+        if result["authenticated"]:
+            self._storage_state = result["storageState"]
+        return result["authenticated"]
+    
+    async def _authenticate_playwright(self, credentials: dict) -> bool:
+        context, page = await self._acquire_context()
         
         try:
-            # Navigate to Starbucks login
-            await self.page.goto("https://www.starbucks.com/account/signin")
-            await self.page.wait_for_load_state("networkidle")
+            # Navigate to Starbucks login; wait only for the form, not for
+            # the page's trackers to go quiet
+            await page.goto(SIGNIN_URL, wait_until="commit")
+            await page.wait_for_load_state("domcontentloaded")
             
             # Fill in credentials
-            await self.page.fill('input[name="username"]', credentials["email"])
-            await self.page.fill('input[name="password"]', credentials["password"])
+            await page.wait_for_selector('input[name="username"]', state="attached")
+            await page.fill('input[name="username"]', credentials["email"])
+            await page.wait_for_selector('input[name="password"]', state="attached")
+            await page.fill('input[name="password"]', credentials["password"])
             
-            # Submit
-            await self.page.click('button[type="submit"]')
-            await self.page.wait_for_load_state("networkidle")
+            # Submit, and wait for the page it leads to; the sign-in page
+            # itself is already loaded
+            async with page.expect_navigation(wait_until="domcontentloaded"):
+                await page.click('button[type="submit"]')
             
             # Check if logged in
-            self.authenticated = "account" in self.page.url.lower()
-            return self.authenticated
-            
-        except Exception as e:
-            logger.error(f"Starbucks authentication failed: {e}")
-            return False
+            authenticated = "account" in page.url.lower()
+            if authenticated:
+                self._storage_state = await context.storage_state()
+            return authenticated
+        finally:
+            await _get_context_pool().release(context, page)
     
     async def search_items(self, query: str, **kwargs) -> list[Item]:
         """Search Starbucks menu."""
+        return self.search_items_sync(query, **kwargs)
+    
+    def search_items_sync(self, query: str, **kwargs) -> list[Item]:
+        """Search the static Starbucks menu; no I/O needed."""
         query_lower = query.lower()
         results = []
         
@@ -108,34 +436,20 @@ class StarbucksConnector(PlatformConnector):
     
     async def estimate_price(self, items: list[dict]) -> float:
         """Estimate total price for items."""
-        total = 0.0
-        
-        for item in items:
-            name = item.get("name", "").lower()
-            size = item.get("size", "grande").lower()
-            quantity = item.get("quantity", 1)
-            
-            # Find matching menu item
-            for menu_name, info in STARBUCKS_MENU.items():
-                if self._fuzzy_match(name, menu_name):
-                    base = info["base_price"]
-                    size_upcharge = info["sizes"].get(size, 0.50)
-                    total += (base + size_upcharge) * quantity
-                    break
-            else:
-                # Default price if not found
-                total += 5.50 * quantity
+        return self.estimate_price_sync(items)
+    
+    def estimate_price_sync(self, items: list[dict]) -> float:
+        """Estimate total price from the precomputed menu prices."""
+        total = sum(
+            _unit_price(item.get("name", ""), item.get("size", "grande").lower())
+            * item.get("quantity", 1)
+            for item in items
+        )
         
         # Add estimated tax
         total *= 1.08
         return round(total, 2)
     
-    def _fuzzy_match(self, query: str, target: str) -> bool:
-        """Check if query matches target (fuzzy)."""
-        query_words = set(query.lower().split())
-        target_words = set(target.lower().split())
-        return len(query_words & target_words) > 0
-    
     async def create_order(
         self,
         items: list[dict],
@@ -161,11 +475,7 @@ class StarbucksConnector(PlatformConnector):
             quantity = item_data.get("quantity", 1)
             
             # Estimate price
-            price = 5.50  # Default
-            for menu_name, info in STARBUCKS_MENU.items():
-                if self._fuzzy_match(name, menu_name):
-                    price = info["base_price"] + info["sizes"].get(size, 0.50)
-                    break
+            price = _unit_price(name, size)
             
             order_items.append(Item(
                 name=name,
@@ -185,7 +495,7 @@ class StarbucksConnector(PlatformConnector):
             items=order_items,
             total_price=round(total, 2),
             status=OrderStatusEnum.CONFIRMED,
-            estimated_ready=datetime.utcnow() + timedelta(minutes=10),
+            estimated_ready=utc_now() + timedelta(minutes=10),
             pickup_location=location or "Nearest Starbucks"
         )
         
@@ -199,7 +509,7 @@ class StarbucksConnector(PlatformConnector):
         return order
     
     async def get_order_status(self, order_id: str) -> OrderStatus:
-        """Get order status."""
+        """Get order status, from a short-lived cache shared by all pollers."""
         order = self.orders.get(order_id)
         
         if not order:
@@ -209,8 +519,25 @@ class StarbucksConnector(PlatformConnector):
                 message="Order not found"
             )
         
+        cached = self._status_cache.get(order_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        async with self._status_locks.setdefault(order_id, asyncio.Lock()):
+            # Another poller may have filled the cache while we waited
+            cached = self._status_cache.get(order_id)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            
+            status = await self._fetch_order_status(order)
+            ttl = READY_STATUS_TTL_SECONDS if status.status == OrderStatusEnum.READY else STATUS_TTL_SECONDS
+            self._status_cache[order_id] = (time.monotonic() + ttl, status)
+            return status
+    
+    async def _fetch_order_status(self, order: Order) -> OrderStatus:
+        """Work out an order's current status."""
         # Simulate order progression
-        elapsed = (datetime.utcnow() - order.created_at).total_seconds()
+        elapsed = time.monotonic() - order.created_mono
         
         if elapsed < 120:  # 2 minutes
             status = OrderStatusEnum.PREPARING
@@ -223,7 +550,7 @@ class StarbucksConnector(PlatformConnector):
             message = "Your order is ready for pickup!"
         
         return OrderStatus(
-            order_id=order_id,
+            order_id=order.order_id,
             status=status,
             message=message,
             estimated_ready=order.estimated_ready
@@ -235,10 +562,12 @@ class StarbucksConnector(PlatformConnector):
             order = self.orders[order_id]
             if order.status in [OrderStatusEnum.PENDING, OrderStatusEnum.CONFIRMED]:
                 order.status = OrderStatusEnum.CANCELLED
+                self._status_cache.pop(order_id, None)
                 return True
         return False
     
     async def close(self):
-        """Clean up browser resources."""
-        if self.browser:
-            await self.browser.close()
+        """Drop this connector's session; the shared browser stays up."""
+        self.authenticated = False
+        self._storage_state = None
+        self._cookies = None
@@ -4,22 +4,45 @@ AgentBuy - Memory Systems
 Memory for user preferences, past interactions, and context.
 """
 import logging
+import os
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict, deque
+from itertools import islice
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Optional
-import json
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Oldest episodic memories are dropped beyond this many
+EPISODIC_MAX = int(os.getenv("AGENTBUY_EPISODIC_MAX", "5000"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> frozenset[str]:
+    return frozenset(_TOKEN_RE.findall(text.lower()))
 
-@dataclass
+
+@dataclass(slots=True, kw_only=True)
 class MemoryItem:
     """A single memory item."""
     content: str
     category: str
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     metadata: dict = field(default_factory=dict)
     embedding: Optional[list[float]] = None
+    
+    def to_dict(self) -> dict:
+        return {
+            "content": self.content,
+            "category": self.category,
+            "timestamp": self.timestamp.isoformat(),
+            "metadata": self.metadata
+        }
 
 
 class MemorySystem:
@@ -31,15 +54,28 @@ class MemorySystem:
     - Semantic Memory: User preferences and facts
     """
     
-    def __init__(self):
+    def __init__(self, max_episodic: int = EPISODIC_MAX):
+        if max_episodic < 1:
+            raise ValueError(f"max_episodic must be at least 1, got {max_episodic}")
+        
         # Working memory - current session
         self.working: dict[str, Any] = {}
         
-        # Episodic memory - past events (in production, use vector DB)
-        self.episodic: list[MemoryItem] = []
+        # Episodic memory - past events, oldest evicted first (in production, use vector DB)
+        self.episodic: deque[MemoryItem] = deque(maxlen=max_episodic)
+        # Each item's words, parallel to episodic
+        self._episodic_tokens: deque[frozenset[str]] = deque(maxlen=max_episodic)
+        # Sequence numbers of items by word and by category, oldest first.
+        # Item n is at episodic[n - first], first being the oldest kept number.
+        self._episodic_index: dict[str, deque[int]] = defaultdict(deque)
+        self._episodic_by_cat: dict[str, deque[int]] = defaultdict(deque)
+        # Every indexed word, sorted, for prefix lookups
+        self._episodic_words: list[str] = []
+        self._episodic_seq = 0
         
         # Semantic memory - user facts/preferences
-        self.semantic: dict[str, dict] = {}
+        self.semantic: dict[tuple[str, str], Any] = {}  # (user_id, key) -> value
+        self._sem_users: dict[str, dict] = {}  # user_id -> all of that user's facts
     
     def set_working(self, key: str, value: Any):
         """Set a value in working memory."""
@@ -53,26 +89,88 @@ class MemorySystem:
         """Clear working memory (end of session)."""
         self.working = {}
     
+    @property
+    def episodic_version(self) -> int:
+        """Count of episodic memories ever added; changes on every add."""
+        return self._episodic_seq
+    
     def add_episodic(self, content: str, category: str, metadata: dict = None):
-        """Add an episodic memory."""
+        """Add an episodic memory, evicting the oldest one when full."""
+        if len(self.episodic) == self.episodic.maxlen:
+            self._evict_oldest()
+        
+        tokens = _tokens(content)
         self.episodic.append(MemoryItem(
             content=content,
             category=category,
             metadata=metadata or {}
         ))
+        self._episodic_tokens.append(tokens)
+        for token in tokens:
+            bucket = self._episodic_index[token]
+            if not bucket:
+                insort(self._episodic_words, token)
+            bucket.append(self._episodic_seq)
+        self._episodic_by_cat[category].append(self._episodic_seq)
+        self._episodic_seq += 1
+    
+    def _evict_oldest(self):
+        """Drop the oldest item from the index; the deques drop it on append."""
+        oldest = self.episodic[0]
+        # The oldest item is at the front of every bucket it is in
+        for token in self._episodic_tokens[0]:
+            bucket = self._episodic_index[token]
+            bucket.popleft()
+            if not bucket:
+                del self._episodic_index[token]
+                del self._episodic_words[bisect_left(self._episodic_words, token)]
+        bucket = self._episodic_by_cat[oldest.category]
+        bucket.popleft()
+        if not bucket:
+            del self._episodic_by_cat[oldest.category]
+    
+    def _words_starting(self, prefix: str) -> list[str]:
+        """Indexed words that start with prefix."""
+        start = bisect_left(self._episodic_words, prefix)
+        # "{" sorts after every character a token can contain
+        end = bisect_left(self._episodic_words, prefix + "{", start)
+        return self._episodic_words[start:end]
     
     def search_episodic(self, query: str, category: str = None, limit: int = 5) -> list[MemoryItem]:
         """
-        Search episodic memory.
+        Search episodic memory, newest first.
+        
+        Every word of the query must start a word of the item, so "lat"
+        finds "latte". Unlike a plain substring search, query words may
+        appear in any order, and they don't match inside a word.
         In production, this would use vector similarity search.
         """
-        results = []
-        query_lower = query.lower()
+        words = _tokens(query)
+        if not words and not category:
+            return list(islice(reversed(self.episodic), max(limit, 0)))
         
-        for item in reversed(self.episodic):  # Most recent first
-            if category and item.category != category:
-                continue
-            if query_lower in item.content.lower():
+        # Each query word's candidates: the buckets of every word it starts
+        candidates = [
+            [self._episodic_index[token] for token in self._words_starting(word)]
+            for word in words
+        ]
+        if category:
+            candidates.append([self._episodic_by_cat.get(category, ())])
+        # Walk the smallest candidate set newest first, checking each item's own words
+        smallest = min(candidates, key=lambda buckets: sum(map(len, buckets)))
+        seqs = smallest[0] if len(smallest) == 1 else sorted(set().union(*smallest))
+        first = self._episodic_seq - len(self.episodic)
+        results = []
+        for seq in reversed(seqs):
+            position = seq - first
+            item_tokens = self._episodic_tokens[position]
+            if all(
+                word in item_tokens or any(t.startswith(word) for t in item_tokens)
+                for word in words
+            ):
+                item = self.episodic[position]
+                if category and item.category != category:
+                    continue
                 results.append(item)
                 if len(results) >= limit:
                     break
@@ -81,18 +179,14 @@ class MemorySystem:
     
     def set_semantic(self, user_id: str, key: str, value: Any):
         """Set a semantic fact about a user."""
-        if user_id not in self.semantic:
-            self.semantic[user_id] = {}
-        self.semantic[user_id][key] = value
+        self.semantic[(user_id, key)] = value
+        self._sem_users.setdefault(user_id, {})[key] = value
     
     def get_semantic(self, user_id: str, key: str = None) -> Any:
         """Get semantic facts about a user."""
-        if user_id not in self.semantic:
-            return {} if key is None else None
-        
         if key is None:
-            return self.semantic[user_id]
-        return self.semantic[user_id].get(key)
+            return self._sem_users.get(user_id, {})
+        return self.semantic.get((user_id, key))
     
     def get_user_context(self, user_id: str) -> dict:
         """Get full context for a user for LLM prompts."""
@@ -109,7 +203,7 @@ class MemorySystem:
     def remember_order(self, user_id: str, order_details: dict):
         """Remember a completed order."""
         self.add_episodic(
-            content=json.dumps(order_details),
+            content=orjson.dumps(order_details, option=orjson.OPT_NON_STR_KEYS).decode(),
             category="order",
             metadata={"user_id": user_id}
         )
@@ -4,13 +4,32 @@ AgentBuy - AgentAuth Tools
 Tools for authorization, budget checking, and transaction logging.
 Integrates with the AgentAuth platform for spending controls.
 """
+import asyncio
 import logging
 from dataclasses import dataclass
 from typing import Optional
 import os
 
+import httpx
+
 logger = logging.getLogger(__name__)
 
+# Random bytes for demo codes and transaction IDs, drawn with one syscall per
+# 4KB instead of one per ID
+_RAND_POOL = bytearray()
+_RAND_OFFSET = 0
+
+
+def _rand_hex(n: int = 8) -> str:
+    """Hex string of n random bytes from the pool."""
+    global _RAND_OFFSET
+    if _RAND_OFFSET + n > len(_RAND_POOL):
+        _RAND_POOL[:] = os.urandom(4096)
+        _RAND_OFFSET = 0
+    out = _RAND_POOL[_RAND_OFFSET:_RAND_OFFSET + n].hex()
+    _RAND_OFFSET += n
+    return out
+
 
 @dataclass
 class AuthorizationResult:
@@ -27,10 +46,32 @@ class AgentAuthTools:
     Provides spending controls and audit logging for AI purchases.
     """
     
-    def __init__(self, api_url: str = None, api_key: str = None):
+    def __init__(
+        self,
+        api_url: str = None,
+        api_key: str = None,
+        client: Optional[httpx.AsyncClient] = None
+    ):
         self.api_url = api_url or os.getenv("AGENTAUTH_API_URL", "https://api.agentauth.in")
         self.api_key = api_key or os.getenv("AGENTAUTH_API_KEY")
-        self._mock_budgets: dict[str, float] = {}  # For demo mode
+        self._mock_budgets: dict[tuple[str, str], float] = {}  # (user_id, category), for demo mode
+        self._auth_headers = {"Authorization": f"Bearer {self.api_key}"}
+        
+        # Pooled connection reused across calls; only closed here if we created it
+        self._client = client
+        self._owns_client = client is None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the pooled HTTP client, creating it on first use."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=True, timeout=10.0)
+        return self._client
+    
+    async def aclose(self):
+        """Close the HTTP client if this instance created it."""
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
     
     async def check_budget(
         self,
@@ -51,8 +92,7 @@ class AgentAuthTools:
         """
         # Demo mode - use mock budgets
         if not self.api_key:
-            budget_key = f"{user_id}:{category}"
-            budget = self._mock_budgets.get(budget_key, 50.0)  # Default $50
+            budget = self._mock_budgets.get((user_id, category), 50.0)  # Default $50
             
             allowed = amount is None or amount <= budget
             
@@ -67,28 +107,26 @@ class AgentAuthTools:
         
         # Production mode - call AgentAuth API
         try:
-            import httpx
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.api_url}/v1/budgets/{user_id}",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    params={"category": category}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    allowed = amount is None or amount <= data.get("remaining", 0)
-                    return {
-                        "success": True,
-                        **data,
-                        "amount_requested": amount,
-                        "allowed": allowed
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"API error: {response.status_code}"
-                    }
+            response = await self._get_client().get(
+                f"{self.api_url}/v1/budgets/{user_id}",
+                headers=self._auth_headers,
+                params={"category": category}
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                allowed = amount is None or amount <= data.get("remaining", 0)
+                return {
+                    "success": True,
+                    **data,
+                    "amount_requested": amount,
+                    "allowed": allowed
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API error: {response.status_code}"
+                }
         except Exception as e:
             logger.error(f"Budget check failed: {e}")
             return {"success": False, "error": str(e)}
@@ -116,12 +154,11 @@ class AgentAuthTools:
         """
         # Demo mode
         if not self.api_key:
-            budget_key = f"{user_id}:{category}"
+            budget_key = (user_id, category)
             budget = self._mock_budgets.get(budget_key, 50.0)
             
             if amount <= budget:
-                import os
-                auth_code = f"auth_{os.urandom(8).hex()}"
+                auth_code = f"auth_{_rand_hex()}"
                 # Deduct from mock budget for demo
                 self._mock_budgets[budget_key] = budget - amount
                 
@@ -143,42 +180,62 @@ class AgentAuthTools:
         
         # Production mode - call AgentAuth API
         try:
-            import httpx
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.api_url}/v1/authorize",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json={
-                        "user_id": user_id,
-                        "transaction": {
-                            "amount": amount,
-                            "currency": "USD",
-                            "merchant_id": merchant,
-                            "description": description,
-                            "category": category
-                        }
-                    }
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "success": True,
-                        "allowed": data.get("decision") == "ALLOW",
-                        "authorization_code": data.get("authorization_code"),
-                        "reason": data.get("reason"),
+            response = await self._get_client().post(
+                f"{self.api_url}/v1/authorize",
+                headers=self._auth_headers,
+                json={
+                    "user_id": user_id,
+                    "transaction": {
                         "amount": amount,
-                        "merchant": merchant
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"API error: {response.status_code}"
+                        "currency": "USD",
+                        "merchant_id": merchant,
+                        "description": description,
+                        "category": category
                     }
+                }
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "success": True,
+                    "allowed": data.get("decision") == "ALLOW",
+                    "authorization_code": data.get("authorization_code"),
+                    "reason": data.get("reason"),
+                    "amount": amount,
+                    "merchant": merchant
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API error: {response.status_code}"
+                }
         except Exception as e:
             logger.error(f"Authorization request failed: {e}")
             return {"success": False, "error": str(e)}
     
+    async def request_authorization_batch(self, requests: list[dict]) -> list[dict]:
+        """
+        Request authorization for several purchases at once.
+        
+        The requests run concurrently over the pooled client. One that raises
+        comes back as a failed result; the others are unaffected.
+        
+        Args:
+            requests: Keyword arguments for request_authorization, one per purchase
+            
+        Returns:
+            Authorization results in request order
+        """
+        results = await asyncio.gather(
+            *(self.request_authorization(**r) for r in requests),
+            return_exceptions=True
+        )
+        return [
+            result if not isinstance(result, BaseException) else {"success": False, "error": str(result)}
+            for result in results
+        ]
+    
     async def log_transaction(
         self,
         user_id: str,
@@ -208,7 +265,7 @@ class AgentAuthTools:
         return {
             "success": True,
             "logged": True,
-            "transaction_id": f"txn_{os.urandom(8).hex()}",
+            "transaction_id": f"txn_{_rand_hex()}",
             "user_id": user_id,
             "authorization_code": authorization_code,
             "amount": amount,
@@ -7,15 +7,295 @@ Used for interacting with any website (Starbucks, Amazon, etc.)
 import asyncio
 import base64
 import logging
+import os
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Awaitable, Callable, Literal, Optional
+from urllib.parse import urlsplit
 
-from playwright.async_api import async_playwright, Browser, Page, BrowserContext
-from openai import AsyncOpenAI
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from playwright.async_api import Browser, Page, BrowserContext, Playwright
 
 logger = logging.getLogger(__name__)
 
 
+# Idle contexts each BrowserContextPool keeps open and ready
+CONTEXT_POOL_SIZE = int(os.getenv("AGENTBUY_BROWSER_POOL_SIZE", "4"))
+
+# Screenshots for the vision model are JPEGs no longer than this on their long
+# side; "low" detail is analysed at 512px anyway
+VISION_MAX_SIDE = 768
+VISION_JPEG_QUALITY = 70
+
+# analyze_pages sends this many screenshots per request
+VISION_BATCH_SIZE = 10
+
+# Vision requests in flight across all BrowserTools, and retries for rate
+# limits and timeouts (with the SDK's jittered exponential backoff)
+VISION_CONCURRENCY = 10
+VISION_MAX_RETRIES = 3
+
+# A page's analysis is reused for repeat questions about the same URL
+# within this many seconds, unless the page navigates or is acted on first
+ANALYSIS_TTL_SECONDS = 60.0
+
+# Lists the clickable and fillable elements in the viewport, each with a
+# selector the other tools accept. Field values are never read, so typed
+# passwords stay out of the prompt.
+_EXTRACT_ACTIONS_JS = """(limit) => {
+    // Ids and names are only used when they pick out exactly one element;
+    // otherwise the element gets a positional path
+    const unique = (sel) => document.querySelectorAll(sel).length === 1;
+    const idSelector = (node) => node.id ? "#" + CSS.escape(node.id) : null;
+    const selectorFor = (el) => {
+        const id = idSelector(el);
+        if (id && unique(id)) return id;
+        const tag = el.tagName.toLowerCase();
+        const name = el.getAttribute("name");
+        if (name) {
+            const byName = `${tag}[name="${CSS.escape(name)}"]`;
+            if (unique(byName)) return byName;
+        }
+        const parts = [];
+        for (let node = el; node && node !== document.body; node = node.parentElement) {
+            let index = 1;
+            for (let sib = node.previousElementSibling; sib; sib = sib.previousElementSibling) {
+                if (sib.tagName === node.tagName) index++;
+            }
+            parts.unshift(`${node.tagName.toLowerCase()}:nth-of-type(${index})`);
+            const parentId = node.parentElement && idSelector(node.parentElement);
+            if (parentId && unique(parentId)) {
+                parts.unshift(parentId);
+                return parts.join(" > ");
+            }
+        }
+        parts.unshift("body");
+        return parts.join(" > ");
+    };
+    const elements = [];
+    const query = "button, a[href], input, select, textarea, [role=button], [onclick]";
+    for (const el of document.querySelectorAll(query)) {
+        if (el.disabled || el.type === "hidden") continue;
+        const r = el.getBoundingClientRect();
+        if (!r.width || !r.height || r.bottom < 0 || r.right < 0
+            || r.top > innerHeight || r.left > innerWidth) continue;
+        const isField = ["INPUT", "SELECT", "TEXTAREA"].includes(el.tagName);
+        const text = (isField
+            ? el.getAttribute("aria-label") || el.placeholder || el.name || ""
+            : el.innerText || el.getAttribute("aria-label") || el.title || ""
+        ).replace(/\\s+/g, " ").trim().slice(0, 80);
+        elements.push({
+            tag: el.tagName.toLowerCase(),
+            role: el.getAttribute("role") || (isField ? el.type : null),
+            text,
+            selector: selectorFor(el)
+        });
+        if (elements.length >= limit) break;
+    }
+    return elements;
+}"""
+
+# Collapses whitespace and truncates in the page, so only what is returned
+# crosses to Python
+_PAGE_TEXT_JS = """(max) => {
+    const text = document.body.innerText
+        .replace(/[ \\t\\u00a0]+/g, " ")
+        .replace(/\\s*\\n\\s*/g, "\\n")
+        .trim();
+    return text.length > max ? text.slice(0, max) + "\\n...[truncated]" : text;
+}"""
+
+# Most characters of page text get_page_text returns
+PAGE_TEXT_MAX_CHARS = 5000
+
+# One Playwright and one Chromium per headless setting for the whole process;
+# each BrowserTools only opens its own context, which is far cheaper
+_browser_lock = asyncio.Lock()
+_playwright: Optional["Playwright"] = None
+_shared_browsers: dict[bool, "Browser"] = {}
+
+
+async def _get_browser(headless: bool) -> "Browser":
+    """Launch the shared browser for this headless setting on first use."""
+    global _playwright
+    browser = _shared_browsers.get(headless)
+    if browser is not None and browser.is_connected():
+        return browser
+    async with _browser_lock:
+        browser = _shared_browsers.get(headless)
+        if browser is None or not browser.is_connected():
+            # Imported here so agents that never browse skip loading Playwright
+            from playwright.async_api import async_playwright
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            browser = await _playwright.chromium.launch(
+                headless=headless,
+                args=['--disable-blink-features=AutomationControlled']
+            )
+            _shared_browsers[headless] = browser
+    return browser
+
+
+class BrowserContextPool:
+    """
+    Warm contexts, each with a blank page, on a shared browser.
+    
+    acquire() hands out an idle context, or opens one when none is idle, and
+    tops the pool back up in the background. release() wipes everything the
+    last borrower left behind (cookies, the storage of every origin it
+    visited, cached responses and its tabs) before pooling the context again,
+    so contexts can pass between users.
+    """
+    
+    def __init__(
+        self,
+        browser_factory: Callable[[], Awaitable["Browser"]],
+        size: int = CONTEXT_POOL_SIZE,
+        **context_options
+    ):
+        """
+        Args:
+            browser_factory: Returns the running browser to open contexts on
+            size: Most idle contexts kept
+            **context_options: Passed to browser.new_context()
+        """
+        self._browser_factory = browser_factory
+        self._context_options = context_options
+        self._idle: asyncio.Queue[tuple["BrowserContext", "Page"]] = asyncio.Queue(maxsize=size)
+        self._refill: Optional[asyncio.Task] = None
+        # Origins each context has loaded a document from, i.e. those that
+        # may hold storage
+        self._origins: dict["BrowserContext", set[str]] = {}
+    
+    async def _open(self, storage_state: dict = None) -> tuple["BrowserContext", "Page"]:
+        browser = await self._browser_factory()
+        context = await browser.new_context(storage_state=storage_state, **self._context_options)
+        origins = self._origins[context] = set()
+        if storage_state:
+            origins.update(o["origin"] for o in storage_state.get("origins", ()))
+        
+        def track(request):
+            if request.is_navigation_request():
+                origin = _origin(request.url)
+                if origin:
+                    origins.add(origin)
+        
+        context.on("request", track)
+        context.on("close", lambda _: self._origins.pop(context, None))
+        return context, await context.new_page()
+    
+    async def _fill(self):
+        """Open contexts until the pool is full."""
+        try:
+            while not self._idle.full():
+                context, page = await self._open()
+                try:
+                    self._idle.put_nowait((context, page))
+                except asyncio.QueueFull:
+                    await context.close()
+        except Exception as e:
+            logger.warning(f"Browser context pool refill failed: {e}")
+    
+    async def acquire(self, storage_state: dict = None) -> tuple["BrowserContext", "Page"]:
+        """
+        Take a ready context and its page.
+        
+        Args:
+            storage_state: Playwright storage state to start from. Cookies are
+                added to a pooled context; state with per-origin storage gets
+                a fresh context, since that can only be set at creation.
+        """
+        if storage_state and any(o.get("localStorage") for o in storage_state.get("origins", ())):
+            return await self._open(storage_state)
+        
+        entry = None
+        while entry is None:
+            try:
+                context, page = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                entry = await self._open()
+                break
+            # Contexts from before a browser relaunch died with it
+            if context.browser and context.browser.is_connected():
+                entry = (context, page)
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(self._fill())
+        
+        if storage_state and storage_state.get("cookies"):
+            try:
+                await entry[0].add_cookies(storage_state["cookies"])
+            except Exception:
+                await self.release(*entry)
+                raise
+        return entry
+    
+    async def release(self, context: "BrowserContext", page: "Page"):
+        """Wipe a context and pool it; close it instead if the pool is full."""
+        try:
+            await self._wipe(context, page)
+            page = await context.new_page()
+            self._idle.put_nowait((context, page))
+        except Exception as e:
+            if not isinstance(e, asyncio.QueueFull):
+                logger.warning(f"Dropping browser context that could not be wiped: {e}")
+            try:
+                await context.close()
+            except Exception:
+                pass
+    
+    async def _wipe(self, context: "BrowserContext", page: "Page"):
+        """Clear every trace of the last borrower from a context."""
+        origins = self._origins.get(context, set())
+        session = await context.new_cdp_session(page)
+        try:
+            for origin in origins:
+                await session.send(
+                    "Storage.clearDataForOrigin",
+                    {"origin": origin, "storageTypes": "all"}
+                )
+            await session.send("Network.clearBrowserCache")
+        finally:
+            await session.detach()
+        origins.clear()
+        await context.clear_cookies()
+        # sessionStorage lives with the tab, so the tabs go too
+        for open_page in context.pages:
+            await open_page.close()
+    
+    async def close(self):
+        """Stop refilling and close every idle context."""
+        if self._refill is not None:
+            self._refill.cancel()
+        while not self._idle.empty():
+            context, _ = self._idle.get_nowait()
+            try:
+                await context.close()
+            except Exception:
+                pass
+
+
+def _origin(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+_context_pools: dict[bool, BrowserContextPool] = {}
+
+
+def _get_context_pool(headless: bool) -> BrowserContextPool:
+    pool = _context_pools.get(headless)
+    if pool is None:
+        pool = _context_pools[headless] = BrowserContextPool(
+            lambda: _get_browser(headless),
+            viewport={'width': 1280, 'height': 800},
+            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+        )
+    return pool
+
+
 @dataclass
 class BrowserState:
     """Current state of the browser."""
@@ -32,48 +312,86 @@ class BrowserTools:
     Uses Playwright for web interaction and GPT-4V for visual understanding.
     """
     
-    def __init__(self, vision_client: AsyncOpenAI = None, headless: bool = True):
+    _vision_semaphore = asyncio.Semaphore(VISION_CONCURRENCY)
+    
+    def __init__(self, vision_client: "AsyncOpenAI" = None, headless: bool = True):
         self.vision_client = vision_client
         self.headless = headless
-        self.browser: Optional[Browser] = None
-        self.context: Optional[BrowserContext] = None
-        self.page: Optional[Page] = None
-        self._playwright = None
+        self.context: Optional["BrowserContext"] = None
+        self.page: Optional["Page"] = None
+        # (url, question, detail) -> (expires_at, analysis), for the page as
+        # it is now; emptied whenever the page navigates or is acted on
+        self._analysis_cache: dict[tuple[str, str, str], tuple[float, str]] = {}
+        self._page_version = 0
+        # Page title, re-read only after the main frame navigates
+        self._cached_title: Optional[str] = None
+        self._navigation_listener = self._on_navigated
+    
+    def _on_navigated(self, frame):
+        if self.page and frame == self.page.main_frame:
+            self._cached_title = None
+            self._page_changed()
+    
+    def _page_changed(self):
+        """Drop analyses of the page as it was."""
+        self._page_version += 1
+        self._analysis_cache.clear()
+    
+    async def _title(self) -> str:
+        if self._cached_title is None:
+            self._cached_title = await self.page.title()
+        return self._cached_title
+    
+    async def acquire(self):
+        """Take a warm context and page from the pool for this instance."""
+        if not self.page:
+            self.context, self.page = await _get_context_pool(self.headless).acquire()
+            self._cached_title = None
+            self.page.on("framenavigated", self._navigation_listener)
+    
+    async def release(self):
+        """Return this instance's context to the pool."""
+        if self.page:
+            self.page.remove_listener("framenavigated", self._navigation_listener)
+            await _get_context_pool(self.headless).release(self.context, self.page)
+        self.context = None
+        self.page = None
+        self._page_changed()
     
     async def _ensure_browser(self):
-        """Ensure browser is initialized."""
-        if not self.browser:
-            self._playwright = await async_playwright().start()
-            self.browser = await self._playwright.chromium.launch(
-                headless=self.headless,
-                args=['--disable-blink-features=AutomationControlled']
-            )
-            self.context = await self.browser.new_context(
-                viewport={'width': 1280, 'height': 800},
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-            )
-            self.page = await self.context.new_page()
+        """Ensure this instance holds a context, acquiring one on first use."""
+        await self.acquire()
     
-    async def navigate(self, url: str) -> dict:
+    async def navigate(
+        self,
+        url: str,
+        wait_selector: str = None,
+        wait_until: str = 'domcontentloaded'
+    ) -> dict:
         """
-        Navigate to a URL.
+        Navigate to a URL; pass wait_selector to wait for an element that must load.
         
         Args:
             url: The URL to navigate to
+            wait_selector: CSS selector of content to wait for after the DOM is ready
+            wait_until: Playwright load state; 'networkidle' rarely settles on
+                pages with ads or long polling
             
         Returns:
             Current page state with title and URL
         """
         await self._ensure_browser()
+        self._page_changed()
         
         try:
-            await self.page.goto(url, wait_until='networkidle', timeout=30000)
-            await asyncio.sleep(1)  # Wait for dynamic content
+            await self.page.goto(url, wait_until=wait_until, timeout=15000)
+            if wait_selector:
+                await self.page.wait_for_selector(wait_selector, timeout=5000)
             
             return {
                 "success": True,
                 "url": self.page.url,
-                "title": await self.page.title()
+                "title": await self._title()
             }
         except Exception as e:
             logger.error(f"Navigation failed: {e}")
@@ -91,6 +409,7 @@ class BrowserTools:
             Success status and new page state
         """
         await self._ensure_browser()
+        self._page_changed()
         
         try:
             if text:
@@ -106,7 +425,7 @@ class BrowserTools:
             return {
                 "success": True,
                 "url": self.page.url,
-                "title": await self.page.title()
+                "title": await self._title()
             }
         except Exception as e:
             logger.error(f"Click failed: {e}")
@@ -125,6 +444,7 @@ class BrowserTools:
             Success status
         """
         await self._ensure_browser()
+        self._page_changed()
         
         try:
             if clear:
@@ -159,12 +479,59 @@ class BrowserTools:
             logger.error(f"Screenshot failed: {e}")
             return {"success": False, "error": str(e)}
     
-    async def analyze_page(self, question: str = "What is on this page and what actions can I take?") -> dict:
+    async def _vision_call(self, **kwargs):
+        """Run a vision completion, capped process-wide and retried on 429s and timeouts."""
+        async with self._vision_semaphore:
+            return await self.vision_client.with_options(
+                max_retries=VISION_MAX_RETRIES
+            ).chat.completions.create(**kwargs)
+    
+    async def _vision_screenshot(self, max_side: Optional[int]) -> str:
+        """
+        Capture the viewport as a base64 JPEG, scaled down to max_side.
+        
+        Chromium scales while encoding, so no image library is needed; other
+        engines fall back to a full-size JPEG.
+        """
+        try:
+            session = await self.context.new_cdp_session(self.page)
+        except Exception:
+            screenshot_bytes = await self.page.screenshot(
+                type='jpeg', quality=VISION_JPEG_QUALITY, full_page=False
+            )
+            return base64.b64encode(screenshot_bytes).decode('utf-8')
+        
+        try:
+            viewport = (await session.send("Page.getLayoutMetrics"))["cssVisualViewport"]
+            width, height = viewport["clientWidth"], viewport["clientHeight"]
+            scale = min(1.0, max_side / max(width, height)) if max_side else 1.0
+            result = await session.send("Page.captureScreenshot", {
+                "format": "jpeg",
+                "quality": VISION_JPEG_QUALITY,
+                "clip": {
+                    "x": viewport["pageX"],
+                    "y": viewport["pageY"],
+                    "width": width,
+                    "height": height,
+                    "scale": scale
+                }
+            })
+            return result["data"]
+        finally:
+            await session.detach()
+    
+    async def analyze_page(
+        self,
+        question: str = "What is on this page and what actions can I take?",
+        detail: Literal['low', 'high'] = 'low'
+    ) -> dict:
         """
         Take screenshot and analyze with GPT-4 Vision.
         
         Args:
             question: What to analyze about the page
+            detail: Vision detail level; 'high' sends the full-size
+                screenshot for pages with small text
             
         Returns:
             Analysis of the page content and available actions
@@ -174,13 +541,25 @@ class BrowserTools:
         if not self.vision_client:
             return {"success": False, "error": "Vision client not configured"}
         
+        key = (self.page.url, question, detail)
+        version = self._page_version
+        cached = self._analysis_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return {
+                "success": True,
+                "url": self.page.url,
+                "title": await self._title(),
+                "analysis": cached[1]
+            }
+        
         try:
             # Take screenshot
-            screenshot_bytes = await self.page.screenshot(full_page=False)
-            screenshot_b64 = base64.b64encode(screenshot_bytes).decode('utf-8')
+            screenshot_b64 = await self._vision_screenshot(
+                VISION_MAX_SIDE if detail == 'low' else None
+            )
             
             # Analyze with GPT-4V
-            response = await self.vision_client.chat.completions.create(
+            response = await self._vision_call(
                 model="gpt-4o",
                 messages=[
                     {
@@ -203,7 +582,8 @@ Provide a structured response:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/png;base64,{screenshot_b64}"
+                                    "url": f"data:image/jpeg;base64,{screenshot_b64}",
+                                    "detail": detail
                                 }
                             }
                         ]
@@ -213,11 +593,14 @@ Provide a structured response:
             )
             
             analysis = response.choices[0].message.content
+            # Not if the page changed while the model was looking at it
+            if self._page_version == version:
+                self._analysis_cache[key] = (time.monotonic() + ANALYSIS_TTL_SECONDS, analysis)
             
             return {
                 "success": True,
                 "url": self.page.url,
-                "title": await self.page.title(),
+                "title": await self._title(),
                 "analysis": analysis
             }
             
@@ -225,6 +608,94 @@ Provide a structured response:
             logger.error(f"Page analysis failed: {e}")
             return {"success": False, "error": str(e)}
     
+    async def analyze_pages(
+        self,
+        screenshots: list[bytes],
+        question: str,
+        detail: Literal['low', 'high'] = 'low'
+    ) -> dict:
+        """
+        Analyze a sequence of page screenshots with one question.
+        
+        The screenshots go to the vision model together, labelled in order,
+        instead of one request each; long sequences are split into batches
+        of VISION_BATCH_SIZE that run concurrently.
+        
+        Args:
+            screenshots: JPEG or PNG screenshots, in the order they were taken
+            question: What to analyze across the pages
+            detail: Vision detail level for every image
+            
+        Returns:
+            One analysis per batch, in order
+        """
+        if not self.vision_client:
+            return {"success": False, "error": "Vision client not configured"}
+        if not screenshots:
+            return {"success": True, "analyses": []}
+        
+        async def analyze_batch(start: int) -> str:
+            content = [{
+                "type": "text",
+                "text": f"""These are screenshots of consecutive webpages, labelled Image {start + 1} onwards in the order they were visited.
+
+Question: {question}
+
+Answer for the sequence as a whole, referring to pages by their image number."""
+            }]
+            for number, image in enumerate(screenshots[start:start + VISION_BATCH_SIZE], start + 1):
+                mime = "image/png" if image.startswith(b"\x89PNG") else "image/jpeg"
+                content.append({"type": "text", "text": f"Image {number}:"})
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime};base64,{base64.b64encode(image).decode('utf-8')}",
+                        "detail": detail
+                    }
+                })
+            response = await self._vision_call(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": content}],
+                max_tokens=1000
+            )
+            return response.choices[0].message.content
+        
+        try:
+            analyses = await asyncio.gather(
+                *(analyze_batch(start) for start in range(0, len(screenshots), VISION_BATCH_SIZE))
+            )
+            return {"success": True, "analyses": list(analyses)}
+        except Exception as e:
+            logger.error(f"Multi-page analysis failed: {e}")
+            return {"success": False, "error": str(e)}
+    
+    async def extract_actions(self, limit: int = 60) -> dict:
+        """
+        List the buttons, links and fields in view with their selectors; cheaper than analyze_page.
+        
+        Reads the DOM instead of sending a screenshot to the vision model,
+        which is enough for most "what can I do here" questions.
+        
+        Args:
+            limit: Most elements to return
+            
+        Returns:
+            Interactive elements as {tag, role, text, selector}
+        """
+        await self._ensure_browser()
+        
+        try:
+            elements = await self.page.evaluate(_EXTRACT_ACTIONS_JS, limit)
+            return {
+                "success": True,
+                "url": self.page.url,
+                "title": await self._title(),
+                "interactive_elements": elements
+            }
+        except Exception as e:
+            logger.error(f"Action extraction failed: {e}")
+            return {"success": False, "error": str(e)}
+    
     async def get_page_text(self) -> dict:
         """
         Get all visible text from the current page.
@@ -235,10 +706,7 @@ Provide a structured response:
         await self._ensure_browser()
         
         try:
-            text = await self.page.inner_text('body')
-            # Truncate if too long
-            if len(text) > 5000:
-                text = text[:5000] + "\n...[truncated]"
+            text = await self.page.evaluate(_PAGE_TEXT_JS, PAGE_TEXT_MAX_CHARS)
             
             return {
                 "success": True,
@@ -261,6 +729,7 @@ Provide a structured response:
             Success status
         """
         await self._ensure_browser()
+        self._page_changed()
         
         try:
             if direction == "down":
@@ -293,8 +762,20 @@ Provide a structured response:
             return {"success": False, "error": f"Element not found: {selector}"}
     
     async def close(self):
-        """Close the browser."""
-        if self.browser:
-            await self.browser.close()
-        if self._playwright:
-            await self._playwright.stop()
+        """Return this instance's context to the pool; the shared browser stays up."""
+        await self.release()
+    
+    @classmethod
+    async def shutdown(cls):
+        """Close the shared browsers and Playwright; call once at process exit."""
+        global _playwright
+        for pool in _context_pools.values():
+            await pool.close()
+        _context_pools.clear()
+        async with _browser_lock:
+            for browser in _shared_browsers.values():
+                await browser.close()
+            _shared_browsers.clear()
+            if _playwright is not None:
+                await _playwright.stop()
+                _playwright = None
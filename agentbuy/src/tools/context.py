@@ -4,10 +4,36 @@ AgentBuy - Context Tools
 Tools for accessing user context, location, and preferences.
 """
 import logging
-from typing import Optional
+import time
+from datetime import datetime
+from typing import Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Lookup results are reused for this long; stores and preferences rarely
+# change within an agent session
+NEARBY_TTL_SECONDS = 300.0
+PREFERENCES_TTL_SECONDS = 300.0
+
+
+class _FrozenDict(dict):
+    """A dict that refuses changes, so cached results can be shared safely."""
+    
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("cached result is read-only")
+    
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+def _freeze(value: Any) -> Any:
+    """Make a result immutable: dicts become _FrozenDicts and lists tuples."""
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
 
 class ContextTools:
     """
@@ -17,6 +43,10 @@ class ContextTools:
     def __init__(self, user_preferences: dict = None):
         self.preferences = user_preferences or {}
         self._location_cache: dict[str, dict] = {}
+        # (query, lat, lon, radius) -> (expires_at, result)
+        self._nearby_cache: dict[tuple, tuple[float, dict]] = {}
+        # (user_id, category) -> (expires_at, result)
+        self._prefs_cache: dict[tuple[str, Optional[str]], tuple[float, dict]] = {}
     
     async def get_user_preferences(self, user_id: str, category: str = None) -> dict:
         """
@@ -29,6 +59,16 @@ class ContextTools:
         Returns:
             User preferences including default orders, dietary restrictions, etc.
         """
+        key = (user_id, category)
+        cached = self._prefs_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        result = _freeze(self._load_preferences(user_id, category))
+        self._prefs_cache[key] = (time.monotonic() + PREFERENCES_TTL_SECONDS, result)
+        return result
+    
+    def _load_preferences(self, user_id: str, category: Optional[str]) -> dict:
         # Demo preferences
         prefs = {
             "user_id": user_id,
@@ -96,6 +136,24 @@ class ContextTools:
         Returns:
             List of nearby matching locations
         """
+        location = location or {}
+        lat, lon = location.get("latitude"), location.get("longitude")
+        # Nearby points (~1km) and similar radii share an entry
+        key = (
+            query.lower(),
+            round(lat, 2) if lat is not None else None,
+            round(lon, 2) if lon is not None else None,
+            round(radius_miles * 2) / 2
+        )
+        cached = self._nearby_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        result = _freeze(self._lookup_nearby(query))
+        self._nearby_cache[key] = (time.monotonic() + NEARBY_TTL_SECONDS, result)
+        return result
+    
+    def _lookup_nearby(self, query: str) -> dict:
         # Demo results for Starbucks search
         if "starbucks" in query.lower() or "coffee" in query.lower():
             return {
@@ -134,7 +192,6 @@ class ContextTools:
         Returns:
             Current time information
         """
-        from datetime import datetime
         now = datetime.now()
         
         return {
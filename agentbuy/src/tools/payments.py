@@ -13,6 +13,24 @@ import stripe
 logger = logging.getLogger(__name__)
 
 
+def _ensure_async_http_client():
+    """
+    Give Stripe's *_async methods, used below, a pooled async transport.
+    
+    With no client configured, one httpx client serves every Stripe call in
+    the process. A sync-only client configured elsewhere is kept for sync
+    calls, with httpx added as its async fallback.
+    """
+    client = stripe.default_http_client
+    if client is None:
+        stripe.default_http_client = stripe.HTTPXClient(allow_sync_methods=True)
+    elif (
+        type(client).request_async is stripe.HTTPClient.request_async
+        and client._async_fallback_client is None
+    ):
+        client._async_fallback_client = stripe.HTTPXClient()
+
+
 class StripePaymentTools:
     """
     Stripe payment processing tools.
@@ -23,6 +41,7 @@ class StripePaymentTools:
         self.api_key = api_key or os.getenv("STRIPE_SECRET_KEY")
         if self.api_key:
             stripe.api_key = self.api_key
+            _ensure_async_http_client()
             logger.info("Stripe initialized")
         else:
             logger.warning("STRIPE_SECRET_KEY not set - payments disabled")
@@ -58,7 +77,7 @@ class StripePaymentTools:
             # Convert to cents for Stripe
             amount_cents = int(amount * 100)
             
-            intent = stripe.PaymentIntent.create(
+            intent = await stripe.PaymentIntent.create_async(
                 amount=amount_cents,
                 currency=currency,
                 automatic_payment_methods={
@@ -111,21 +130,18 @@ class StripePaymentTools:
             return {"success": False, "error": "Stripe not configured"}
         
         try:
-            intent = stripe.PaymentIntent.confirm(
+            # Expanding the charge returns its receipt URL in the same response
+            intent = await stripe.PaymentIntent.confirm_async(
                 payment_intent_id,
-                payment_method=payment_method
+                payment_method=payment_method,
+                expand=["latest_charge"]
             )
             
             logger.info(f"Confirmed payment: {intent.id} - {intent.status}")
             
-            # Get receipt URL if available (may not be present immediately)
-            receipt_url = None
-            if hasattr(intent, 'latest_charge') and intent.latest_charge:
-                try:
-                    charge = stripe.Charge.retrieve(intent.latest_charge)
-                    receipt_url = charge.receipt_url
-                except:
-                    pass
+            # Receipt URL may not be present immediately
+            charge = intent.latest_charge
+            receipt_url = getattr(charge, "receipt_url", None) if charge else None
             
             return {
                 "success": intent.status == "succeeded",
@@ -192,13 +208,106 @@ class StripePaymentTools:
         else:
             return confirm_result
     
+    async def prepare_payment(
+        self,
+        amount: float,
+        merchant_name: str,
+        description: str = None
+    ) -> dict:
+        """
+        Create an unconfirmed PaymentIntent before authorization completes.
+        
+        Nothing is charged until confirm_prepared_payment(), so this can run
+        alongside the AgentAuth request. Call cancel_payment() if the payment
+        is denied.
+        
+        Args:
+            amount: Amount in dollars
+            merchant_name: Merchant name
+            description: Payment description
+            
+        Returns:
+            PaymentIntent details
+        """
+        return await self.create_payment_intent(
+            amount=amount,
+            description=description or f"Payment to {merchant_name}",
+            merchant_name=merchant_name
+        )
+    
+    async def confirm_prepared_payment(
+        self,
+        payment_intent_id: str,
+        amount: float,
+        merchant_name: str,
+        authorization_code: str
+    ) -> dict:
+        """
+        Confirm a PaymentIntent from prepare_payment() once authorized.
+        
+        Args:
+            payment_intent_id: The prepared PaymentIntent ID
+            amount: Amount in dollars
+            merchant_name: Merchant name
+            authorization_code: AgentAuth authorization code
+            
+        Returns:
+            Complete payment result, same shape as process_payment()
+        """
+        # Confirm can't set metadata, so link the authorization first; a
+        # charge must never be captured without it
+        tagged = await self._tag_authorization(payment_intent_id, authorization_code)
+        if not tagged.get("success"):
+            await self.cancel_payment(payment_intent_id)
+            return tagged
+        
+        confirm_result = await self.confirm_payment(payment_intent_id=payment_intent_id)
+        
+        if not confirm_result.get("success"):
+            await self.cancel_payment(payment_intent_id)
+            return confirm_result
+        
+        return {
+            "success": True,
+            "message": f"Payment of ${amount:.2f} to {merchant_name} succeeded",
+            "payment_id": confirm_result["payment_intent_id"],
+            "amount": amount,
+            "merchant": merchant_name,
+            "authorization_code": authorization_code,
+            "receipt_url": confirm_result.get("receipt_url")
+        }
+    
+    async def _tag_authorization(self, payment_intent_id: str, authorization_code: str) -> dict:
+        """Attach the AgentAuth code to a PaymentIntent's metadata."""
+        try:
+            await stripe.PaymentIntent.modify_async(
+                payment_intent_id,
+                metadata={"agentauth_code": authorization_code}
+            )
+            return {"success": True}
+        except stripe.error.StripeError as e:
+            logger.error(f"Could not tag {payment_intent_id} with authorization: {e}")
+            return {"success": False, "error": f"Could not record authorization: {e}"}
+    
+    async def cancel_payment(self, payment_intent_id: str) -> dict:
+        """Cancel an unconfirmed PaymentIntent."""
+        if not self.api_key:
+            return {"success": False, "error": "Stripe not configured"}
+        
+        try:
+            intent = await stripe.PaymentIntent.cancel_async(payment_intent_id)
+            return {"success": True, "payment_intent_id": intent.id, "status": intent.status}
+        except stripe.error.StripeError as e:
+            logger.warning(f"Could not cancel {payment_intent_id}: {e}")
+            return {"success": False, "error": str(e)}
+    
     async def get_payment_status(self, payment_intent_id: str) -> dict:
         """Get the status of a payment."""
         if not self.api_key:
             return {"success": False, "error": "Stripe not configured"}
         
         try:
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = await stripe.PaymentIntent.retrieve_async(payment_intent_id)
             return {
                 "success": True,
                 "payment_intent_id": intent.id,
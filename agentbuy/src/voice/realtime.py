@@ -0,0 +1,127 @@
+"""
+AgentBuy - Realtime Transcription
+
+A persistent OpenAI Realtime transcription session over one WebSocket.
+Audio frames are streamed as they are captured and finished utterances come
+back as transcripts, so a conversation pays the connection setup once instead
+of one HTTPS upload per turn.
+"""
+import base64
+import json
+import logging
+import os
+from typing import AsyncIterator, Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+REALTIME_URL = "wss://api.openai.com/v1/realtime?intent=transcription"
+
+
+class RealtimeTranscriber:
+    """
+    Streaming speech-to-text over the OpenAI Realtime API.
+
+    Audio must be 16-bit PCM, 24kHz, mono. Server-side voice activity
+    detection decides where each utterance ends.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = "whisper-1",
+        url: str = REALTIME_URL
+    ):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.model = model
+        self.url = url
+        self._ws: Optional[websockets.ClientConnection] = None
+        # Committed utterances still awaiting a transcript, and whether
+        # finish() has flushed the audio buffer
+        self._untranscribed: set[str] = set()
+        self._finishing = False
+        self._flushed = False
+
+    async def connect(self):
+        """Open the WebSocket and configure the transcription session."""
+        if self._ws:
+            return
+
+        self._ws = await websockets.connect(
+            self.url,
+            additional_headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "OpenAI-Beta": "realtime=v1"
+            }
+        )
+        await self._ws.send(json.dumps({
+            "type": "transcription_session.update",
+            "session": {
+                "input_audio_format": "pcm16",
+                "input_audio_transcription": {"model": self.model},
+                "turn_detection": {"type": "server_vad"}
+            }
+        }))
+        logger.info("Realtime transcription session opened")
+
+    async def send_audio(self, pcm16: bytes):
+        """
+        Push a chunk of captured audio.
+
+        Args:
+            pcm16: Raw 16-bit PCM audio (24kHz, mono)
+        """
+        await self._ws.send(json.dumps({
+            "type": "input_audio_buffer.append",
+            "audio": base64.b64encode(pcm16).decode("ascii")
+        }))
+
+    async def finish(self):
+        """
+        Mark the end of the audio.
+
+        Whatever is still buffered is committed as a final utterance, and
+        transcripts() stops once every utterance has been transcribed.
+        """
+        self._finishing = True
+        await self._ws.send(json.dumps({"type": "input_audio_buffer.commit"}))
+
+    async def transcripts(self) -> AsyncIterator[str]:
+        """
+        Yield each completed utterance transcript until the session closes,
+        or until the last one after finish().
+        """
+        async for raw in self._ws:
+            event = json.loads(raw)
+            event_type = event.get("type")
+
+            if event_type == "input_audio_buffer.committed":
+                self._untranscribed.add(event.get("item_id"))
+                self._flushed = self._finishing
+            elif event_type == "conversation.item.input_audio_transcription.completed":
+                self._untranscribed.discard(event.get("item_id"))
+                text = event.get("transcript", "").strip()
+                if text:
+                    logger.info(f"Transcribed: {text}")
+                    yield text
+            elif event_type == "conversation.item.input_audio_transcription.failed":
+                self._untranscribed.discard(event.get("item_id"))
+                logger.error(f"Transcription failed: {event.get('error')}")
+            elif event_type == "error":
+                error = event.get("error") or {}
+                if self._finishing and error.get("code") == "input_audio_buffer_commit_empty":
+                    # Voice activity detection had already committed it all
+                    self._flushed = True
+                else:
+                    logger.error(f"Realtime error: {error}")
+
+            if self._flushed and not self._untranscribed:
+                return
+
+    async def close(self):
+        """Close the WebSocket."""
+        if self._ws:
+            await self._ws.close()
+            self._ws = None
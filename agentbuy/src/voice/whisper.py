@@ -0,0 +1,55 @@
+"""
+AgentBuy - Whisper Transcription
+
+Posts audio bytes straight to the Whisper REST endpoint as a multipart upload,
+without temp files or the SDK's file handling.
+"""
+import logging
+import mimetypes
+
+import httpx
+
+from src.agent.llm import get_http_client
+
+logger = logging.getLogger(__name__)
+
+
+OPENAI_API_BASE = "https://api.openai.com/v1"
+
+
+async def transcribe(
+    audio_bytes: bytes,
+    api_key: str,
+    filename: str = "audio.webm",
+    model: str = "whisper-1",
+    base_url: str = OPENAI_API_BASE,
+    http_client: httpx.AsyncClient = None
+) -> str:
+    """
+    Transcribe an audio clip with Whisper.
+
+    Args:
+        audio_bytes: Raw audio data (wav, mp3, webm, ...)
+        api_key: OpenAI API key
+        filename: Upload name; Whisper infers the audio format from its extension
+        model: Transcription model
+        base_url: OpenAI API base URL
+        http_client: Client to send with (defaults to the shared OpenAI pool)
+
+    Returns:
+        Transcribed text
+    """
+    client = http_client or get_http_client()
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    response = await client.post(
+        f"{base_url.rstrip('/')}/audio/transcriptions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        files={"file": (filename, audio_bytes, content_type)},
+        data={"model": model}
+    )
+    response.raise_for_status()
+
+    text = response.json()["text"]
+    logger.info(f"Transcribed: {text}")
+    return text
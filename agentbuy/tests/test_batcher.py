@@ -0,0 +1,100 @@
+"""
+AgentBuy - Request Batcher Test
+
+Tests how RequestBatcher groups, flushes and fails batches.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.agent.batcher import RequestBatcher
+
+
+class Recorder:
+    """Batch function that records each batch and echoes items back."""
+
+    def __init__(self):
+        self.batches: list[list] = []
+
+    async def __call__(self, items: list) -> list:
+        self.batches.append(list(items))
+        return [f"result:{item}" for item in items]
+
+
+async def test_window_flush():
+    """Items submitted within the window share one batch."""
+    recorder = Recorder()
+    batcher = RequestBatcher(recorder, window=0.01, max_batch=16)
+
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+
+    assert results == ["result:0", "result:1", "result:2"]
+    assert recorder.batches == [[0, 1, 2]]
+
+
+async def test_max_batch_flush():
+    """A full batch is sent at once, without waiting for the window."""
+    recorder = Recorder()
+    batcher = RequestBatcher(recorder, window=60, max_batch=2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.submit("a"), batcher.submit("b")),
+        timeout=1
+    )
+
+    assert results == ["result:a", "result:b"]
+    assert recorder.batches == [["a", "b"]]
+
+
+async def test_keys_never_share_a_batch():
+    """Items under different keys go out in separate batches."""
+    recorder = Recorder()
+    batcher = RequestBatcher(recorder, window=0.01)
+
+    results = await asyncio.gather(
+        batcher.submit("a", key="user_1"),
+        batcher.submit("b", key="user_2"),
+        batcher.submit("c", key="user_1")
+    )
+
+    assert results == ["result:a", "result:b", "result:c"]
+    assert sorted(recorder.batches) == [["a", "c"], ["b"]]
+
+
+async def test_error_fails_every_item():
+    """An exception from the batch function reaches every caller in the batch."""
+    async def failing(items):
+        raise RuntimeError("upstream down")
+
+    batcher = RequestBatcher(failing, window=0.01)
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit(2), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+async def test_length_mismatch_fails_the_batch():
+    """A batch function returning the wrong number of results is an error."""
+    async def short(items):
+        return items[:-1]
+
+    batcher = RequestBatcher(short, window=0.01)
+    with pytest.raises(ValueError):
+        await asyncio.gather(batcher.submit(1), batcher.submit(2))
+
+
+async def test_later_submissions_start_a_new_batch():
+    """Items after a flush are not merged into the batch already sent."""
+    recorder = Recorder()
+    batcher = RequestBatcher(recorder, window=0.01)
+
+    await batcher.submit("first")
+    await batcher.submit("second")
+
+    assert recorder.batches == [["first"], ["second"]]
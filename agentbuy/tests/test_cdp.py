@@ -0,0 +1,118 @@
+"""
+AgentBuy - CDP Driver Test
+
+Tests how CDPBrowser routes replies and events, and surfaces errors,
+against a stub WebSocket.
+"""
+import asyncio
+import os
+import sys
+
+import orjson
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.connectors.cdp import CDPBrowser, CDPError
+
+
+class StubSocket:
+    """Stands in for the browser connection: records sends, replays pushes."""
+
+    def __init__(self):
+        self.sent: list[dict] = []
+        self._incoming: asyncio.Queue = asyncio.Queue()
+
+    async def send(self, raw: str):
+        self.sent.append(orjson.loads(raw))
+
+    def push(self, message: dict):
+        self._incoming.put_nowait(orjson.dumps(message))
+
+    def hang_up(self):
+        self._incoming.put_nowait(None)
+
+    async def close(self):
+        self.hang_up()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raw = await self._incoming.get()
+        if raw is None:
+            raise StopAsyncIteration
+        return raw
+
+
+async def _call(browser: CDPBrowser, ws: StubSocket, method: str, **kwargs) -> asyncio.Task:
+    """Start a command and wait until it is on the wire."""
+    task = asyncio.create_task(browser._cdp_call(method, **kwargs))
+    while not any(m["method"] == method for m in ws.sent):
+        await asyncio.sleep(0)
+    return task
+
+
+async def test_replies_resolve_by_id():
+    """Each reply resolves the command with its id, in any order."""
+    ws = StubSocket()
+    browser = CDPBrowser(None, ws, "")
+
+    first = await _call(browser, ws, "Target.createBrowserContext")
+    second = await _call(browser, ws, "Page.navigate", params={"url": "about:blank"}, session_id="s1")
+    assert ws.sent[1] == {
+        "id": 2, "method": "Page.navigate", "params": {"url": "about:blank"}, "sessionId": "s1"
+    }
+
+    ws.push({"id": 2, "result": {"frameId": "f"}})
+    ws.push({"id": 1, "result": {"browserContextId": "c"}})
+
+    assert await second == {"frameId": "f"}
+    assert await first == {"browserContextId": "c"}
+    ws.hang_up()
+
+
+async def test_events_resolve_waiters_for_their_session():
+    """An event only resolves waiters registered for its method and session."""
+    ws = StubSocket()
+    browser = CDPBrowser(None, ws, "")
+
+    mine = browser.expect_event("Page.domContentEventFired", "s1")
+    other = browser.expect_event("Page.domContentEventFired", "s2")
+    ws.push({"method": "Page.domContentEventFired", "sessionId": "s1", "params": {"timestamp": 1}})
+
+    assert await asyncio.wait_for(mine, timeout=1) == {"timestamp": 1}
+    assert not other.done()
+    ws.hang_up()
+
+
+async def test_error_reply_raises():
+    """A reply carrying an error fails that command with its message."""
+    ws = StubSocket()
+    browser = CDPBrowser(None, ws, "")
+
+    task = await _call(browser, ws, "Page.navigate")
+    ws.push({"id": 1, "error": {"code": -32000, "message": "Cannot navigate"}})
+
+    with pytest.raises(CDPError, match="Cannot navigate"):
+        await task
+    ws.hang_up()
+
+
+async def test_disconnect_fails_pending_calls_and_waiters():
+    """Losing the connection fails everything in flight, and later calls."""
+    ws = StubSocket()
+    browser = CDPBrowser(None, ws, "")
+
+    task = await _call(browser, ws, "Page.navigate")
+    waiter = browser.expect_event("Page.domContentEventFired", "s1")
+    ws.hang_up()
+
+    with pytest.raises(CDPError):
+        await task
+    with pytest.raises(CDPError):
+        await waiter
+    assert not browser.is_connected
+    with pytest.raises(CDPError):
+        await browser._cdp_call("Page.enable")
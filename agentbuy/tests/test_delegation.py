@@ -0,0 +1,153 @@
+"""
+AgentBuy - Delegation Token Test
+
+Tests the early rejections AgentOrchestrator makes from delegation token
+claims, and that everything else is left to AgentAuth's decision.
+"""
+import base64
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.agent.intent_parser import ParsedIntent
+from src.agent.orchestrator import AgentOrchestrator, DelegationToken
+from src.connectors.base import Item, Order
+
+
+def _jwt(claims) -> str:
+    """An unsigned JWT carrying claims; the orchestrator never checks signatures."""
+    def encode(part) -> str:
+        return base64.urlsafe_b64encode(orjson.dumps(part)).decode().rstrip("=")
+    return f"{encode({'alg': 'HS256'})}.{encode(claims)}.signature"
+
+
+def _token(**constraints) -> str:
+    exp = constraints.pop("exp", time.time() + 3600)
+    return _jwt({"exp": exp, "constraints": constraints})
+
+
+class FakeParser:
+    async def parse(self, text: str) -> ParsedIntent:
+        return ParsedIntent(
+            action="purchase",
+            platform="starbucks",
+            items=[{"name": "Latte"}],
+            raw_text=text,
+            confidence=0.9
+        )
+
+
+class FakeConnector:
+    def __init__(self, price: float):
+        self.price = price
+        self.orders = []
+
+    async def estimate_price(self, items):
+        return self.price
+
+    async def create_order(self, items, authorization_code, **kwargs):
+        self.orders.append(authorization_code)
+        return Order(
+            order_id="order_1",
+            platform="starbucks",
+            items=[Item(name="Latte", price=self.price)],
+            total_price=self.price
+        )
+
+
+class FakeAgentAuth:
+    def __init__(self, decision: str):
+        self.decision = decision
+        self.calls = []
+
+    async def authorize(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(
+            decision=self.decision,
+            authorization_code="auth_1234567890",
+            reason="denied by policy"
+        )
+
+
+def _orchestrator(decision: str = "ALLOW", price: float = 5.0):
+    agentauth = FakeAgentAuth(decision)
+    connector = FakeConnector(price)
+    orchestrator = AgentOrchestrator(
+        openai_client=object(),
+        agentauth_client=agentauth,
+        connectors={"starbucks": connector}
+    )
+    orchestrator.intent_parser = FakeParser()
+    return orchestrator, agentauth, connector
+
+
+@pytest.mark.parametrize("token, reason", [
+    (_token(max_amount=4.0), "exceeds consent limit"),
+    (_token(allowed_merchants=["amazon"]), "not in the allowed list"),
+    (_token(exp=time.time() - 1), "expired"),
+    (_token(currency="EUR"), "does not match consent currency"),
+])
+async def test_token_limits_reject_without_asking_agentauth(token, reason):
+    """Purchases the token rules out are denied before the AgentAuth call."""
+    orchestrator, agentauth, connector = _orchestrator()
+
+    result = await orchestrator.execute_command("latte", "user_1", token)
+
+    assert not result.success
+    assert result.error == "authorization_denied"
+    assert reason in result.message
+    assert agentauth.calls == []
+    assert connector.orders == []
+
+
+@pytest.mark.parametrize("token", [
+    "mock_token",
+    "header.!!!not-base64!!!.signature",
+    "header..signature",
+    _jwt(["not", "an", "object"]),
+    _jwt({"constraints": "unlimited"}),
+    _jwt({"constraints": {"max_amount": "1"}}),
+    _jwt({"constraints": {"allowed_merchants": "amazon"}}),
+    _jwt({"exp": "yesterday"}),
+])
+async def test_malformed_tokens_defer_to_agentauth(token):
+    """Tokens that can't be read reject nothing; AgentAuth decides."""
+    assert DelegationToken.from_jwt(token) is None
+
+    orchestrator, agentauth, connector = _orchestrator(decision="ALLOW")
+    result = await orchestrator.execute_command("latte", "user_1", token)
+
+    assert len(agentauth.calls) == 1
+    assert result.success
+    assert connector.orders == ["auth_1234567890"]
+
+
+async def test_within_limits_keeps_agentauth_allow():
+    """A token the purchase satisfies never overrides AgentAuth's ALLOW."""
+    token = _token(max_amount=10.0, currency="USD", allowed_merchants=["starbucks"])
+    orchestrator, agentauth, connector = _orchestrator(decision="ALLOW", price=10.0)
+
+    result = await orchestrator.execute_command("latte", "user_1", token)
+
+    assert result.success
+    assert agentauth.calls[0]["amount"] == 10.0
+    assert connector.orders == ["auth_1234567890"]
+
+
+async def test_within_limits_never_approves_on_its_own():
+    """Satisfying the token's claims is not approval; AgentAuth's DENY stands."""
+    orchestrator, agentauth, connector = _orchestrator(decision="DENY")
+
+    result = await orchestrator.execute_command("latte", "user_1", _token(max_amount=10.0))
+
+    assert not result.success
+    assert "denied by policy" in result.message
+    assert len(agentauth.calls) == 1
+    assert connector.orders == []
@@ -0,0 +1,85 @@
+"""
+AgentBuy - Memory System Test
+
+Tests episodic memory search, its word and category indexes, and eviction.
+"""
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.memory.memory import MemorySystem
+
+
+def _contents(items) -> list[str]:
+    return [item.content for item in items]
+
+
+def test_search_matches_every_word_newest_first():
+    """Items need every query word, in any order; newest come first."""
+    memory = MemorySystem()
+    memory.add_episodic("grande iced latte", "order")
+    memory.add_episodic("iced tea", "order")
+    memory.add_episodic("latte, iced, venti", "order")
+
+    assert _contents(memory.search_episodic("iced latte")) == [
+        "latte, iced, venti", "grande iced latte"
+    ]
+    assert _contents(memory.search_episodic("mocha")) == []
+
+
+def test_search_matches_word_prefixes():
+    """A query word finds the words it starts, not words it is inside of."""
+    memory = MemorySystem()
+    memory.add_episodic('{"order_id": "sbux_1", "item": "latte"}', "order")
+
+    assert len(memory.search_episodic("lat")) == 1
+    assert len(memory.search_episodic("ord")) == 1
+    assert memory.search_episodic("atte") == []
+
+
+def test_search_by_category():
+    """A category narrows the search, with or without query words."""
+    memory = MemorySystem()
+    memory.add_episodic("latte order", "order")
+    memory.add_episodic("latte preference noted", "note")
+
+    assert _contents(memory.search_episodic("latte", category="note")) == ["latte preference noted"]
+    assert _contents(memory.search_episodic("", category="order")) == ["latte order"]
+    assert memory.search_episodic("latte", category="payment") == []
+
+
+def test_search_limit():
+    """No more than limit items come back, and an empty query lists the newest."""
+    memory = MemorySystem()
+    for i in range(5):
+        memory.add_episodic(f"order {i}", "order")
+
+    assert _contents(memory.search_episodic("order", limit=2)) == ["order 4", "order 3"]
+    assert _contents(memory.search_episodic("", limit=1)) == ["order 4"]
+
+
+def test_eviction_drops_oldest_from_indexes():
+    """Past max_episodic the oldest item leaves every index."""
+    memory = MemorySystem(max_episodic=2)
+    memory.add_episodic("mocha order", "order")
+    memory.add_episodic("latte order", "order")
+    memory.add_episodic("tea note", "note")
+
+    assert _contents(memory.episodic) == ["latte order", "tea note"]
+    assert memory.search_episodic("mocha") == []
+    assert memory.search_episodic("moc") == []
+    assert _contents(memory.search_episodic("order")) == ["latte order"]
+    assert _contents(memory.search_episodic("", category="note")) == ["tea note"]
+    assert "mocha" not in memory._episodic_index
+    assert "mocha" not in memory._episodic_words
+    assert memory.episodic_version == 3
+
+
+def test_max_episodic_must_be_positive():
+    """A memory that can hold no episodes is rejected up front."""
+    with pytest.raises(ValueError):
+        MemorySystem(max_episodic=0)
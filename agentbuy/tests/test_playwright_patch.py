@@ -0,0 +1,89 @@
+"""
+AgentBuy - Playwright Stack Capture Patch Test
+
+The Starbucks connector swaps out private parts of Playwright's connection
+module. These tests fail when an upgrade moves or reshapes them.
+"""
+import importlib.metadata
+import inspect
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import playwright._impl._connection as _connection
+
+from src.connectors import starbucks
+from src.connectors.starbucks import _disable_stack_capture, _nearest_frame_stack_trace
+
+
+def test_patched_internals_exist():
+    """Everything the patch reads or replaces is where it expects."""
+    assert callable(_connection._capture_stack_trace)
+    assert isinstance(_connection._PLAYWRIGHT_MODULE_PATH, str)
+    assert _connection.traceback.extract_stack
+    assert set(_connection.ParsedStackTrace.__annotations__) == {"frames", "apiName", "title"}
+    assert set(_connection.StackFrame.__annotations__) == {"file", "line", "column", "function"}
+
+    source = inspect.getsource(_connection.Connection.wrap_api_call)
+    assert "_capture_stack_trace()" in source
+    assert "parsed_st['apiName']" in source
+
+
+# Stand-ins for a public Playwright method and wrap_api_call, compiled as if
+# they lived inside the Playwright package
+_FAKE_PLAYWRIGHT = """
+def click(capture):
+    return wrap_api_call(capture)
+
+def wrap_api_call(capture):
+    return capture()
+"""
+
+
+def test_nearest_frame_matches_playwright():
+    """Called through Playwright, the patch reports the same apiName and first frame."""
+    fake = {}
+    exec(compile(
+        _FAKE_PLAYWRIGHT,
+        os.path.join(_connection._PLAYWRIGHT_MODULE_PATH, "_fake_api.py"),
+        "exec"
+    ), fake)
+
+    original = fake["click"](_connection._capture_stack_trace)
+    patched = fake["click"](_nearest_frame_stack_trace)
+
+    assert patched["apiName"] == original["apiName"] == "click"
+    assert len(patched["frames"]) == 1
+    # Same frame, captured one line apart
+    assert patched["frames"][0]["line"] == original["frames"][0]["line"] + 1
+    assert {**patched["frames"][0], "line": 0} == {**original["frames"][0], "line": 0}
+    assert patched["frames"][0]["function"] == "test_nearest_frame_matches_playwright"
+
+
+@pytest.mark.skipif(
+    not importlib.metadata.version("playwright").startswith(starbucks.PLAYWRIGHT_PATCHED_VERSION + "."),
+    reason="installed Playwright runs unpatched"
+)
+def test_patch_applies_to_patched_version(monkeypatch):
+    """The Playwright release the patch targets gets it."""
+    monkeypatch.setattr(_connection, "_capture_stack_trace", _connection._capture_stack_trace)
+    monkeypatch.setattr(_connection, "traceback", _connection.traceback)
+
+    _disable_stack_capture()
+
+    assert _connection._capture_stack_trace is _nearest_frame_stack_trace
+
+
+def test_patch_skips_other_versions(monkeypatch):
+    """Any other Playwright version keeps its own stack capture."""
+    original = _connection._capture_stack_trace
+    monkeypatch.setattr(_connection, "_capture_stack_trace", original)
+    monkeypatch.setattr(starbucks, "PLAYWRIGHT_PATCHED_VERSION", "0.0")
+
+    _disable_stack_capture()
+
+    assert _connection._capture_stack_trace is original
@@ -0,0 +1,108 @@
+"""
+AgentBuy - ReAct Reasoning Test
+
+Runs ReActEngine.think against a real OpenAI client whose HTTP transport
+returns canned completions, so an SDK without the methods think calls
+fails here instead of turning every step into an error thought.
+"""
+import os
+import sys
+
+import httpx
+import orjson
+from openai import AsyncOpenAI
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.brain.reasoning import AgentContext, ReActEngine, ThoughtType
+
+REPLY = {
+    "thought": "Look up the menu first",
+    "thought_type": "reasoning",
+    "action": "starbucks_search_menu",
+    "action_input": '{"query": "latte"}',
+    "confidence": 0.9
+}
+
+
+def _completion(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={
+        "id": "chatcmpl_1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": orjson.dumps(REPLY).decode()}
+        }]
+    })
+
+
+def _stream(request: httpx.Request) -> httpx.Response:
+    content = orjson.dumps(REPLY).decode()
+    pieces = [content[i:i + 10] for i in range(0, len(content), 10)]
+
+    events = []
+    for i, piece in enumerate(pieces):
+        delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+        events.append({
+            "id": "chatcmpl_1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+        })
+    events.append({
+        "id": "chatcmpl_1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+    })
+
+    body = "".join(f"data: {orjson.dumps(event).decode()}\n\n" for event in events)
+    return httpx.Response(
+        200,
+        headers={"content-type": "text/event-stream"},
+        content=(body + "data: [DONE]\n\n").encode()
+    )
+
+
+def _engine(handler) -> ReActEngine:
+    client = AsyncOpenAI(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return ReActEngine(client, tools={"starbucks_search_menu": lambda query: None})
+
+
+def _context() -> AgentContext:
+    return AgentContext(goal="Order a latte", user_id="user_1", session_id="session_1")
+
+
+async def test_think_parses_reply():
+    """Without on_delta the structured reply becomes the next thought."""
+    thought = await _engine(_completion).think(_context())
+
+    assert not thought.is_error, thought.content
+    assert thought.type == ThoughtType.REASONING
+    assert thought.next_action == "starbucks_search_menu"
+    assert thought.action_input == {"query": "latte"}
+    assert thought.confidence == 0.9
+
+
+async def test_think_streams_reply():
+    """With on_delta the raw reply streams through it and still parses."""
+    deltas = []
+
+    async def on_delta(text: str):
+        deltas.append(text)
+
+    thought = await _engine(_stream).think(_context(), on_delta=on_delta)
+
+    assert not thought.is_error, thought.content
+    assert thought.next_action == "starbucks_search_menu"
+    assert thought.action_input == {"query": "latte"}
+    assert orjson.loads("".join(deltas)) == REPLY
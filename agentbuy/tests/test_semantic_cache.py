@@ -0,0 +1,95 @@
+"""
+AgentBuy - Semantic Intent Cache Test
+
+Tests SemanticIntentCache hits, misses, expiry, eviction and persistence
+with hand-made vectors in place of embeddings.
+"""
+import os
+import sys
+import time
+from array import array
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.agent import semantic_cache
+from src.agent.semantic_cache import SemanticIntentCache, _normalize
+
+NOTION = {"action": "pay", "amount": 10, "merchant": "Notion"}
+
+
+def _vector(*values: float) -> array:
+    return _normalize(list(values))
+
+
+def _cache(**kwargs) -> SemanticIntentCache:
+    return SemanticIntentCache(llm=None, **kwargs)
+
+
+async def test_paraphrase_hits():
+    """A close vector with the same amount and merchant reuses the intent."""
+    cache = _cache()
+    await cache.add("Pay $10 for Notion", _vector(1, 0), NOTION)
+
+    hit = await cache.lookup("Pay 10 dollars to Notion", _vector(1, 0.1))
+
+    assert hit == NOTION
+    hit["amount"] = 99
+    assert (await cache.lookup("Pay 10 dollars to Notion", _vector(1, 0.1)))["amount"] == 10
+
+
+async def test_below_threshold_misses():
+    """A vector less similar than the threshold is a miss."""
+    cache = _cache(threshold=0.92)
+    await cache.add("Pay $10 for Notion", _vector(1, 0), NOTION)
+
+    assert await cache.lookup("Pay $10 for Notion", _vector(1, 1)) is None
+
+
+async def test_different_amount_misses():
+    """Identical vectors still miss when the numbers differ."""
+    cache = _cache()
+    await cache.add("Pay $10 for Notion", _vector(1, 0), NOTION)
+
+    assert await cache.lookup("Pay $100 for Notion", _vector(1, 0)) is None
+
+
+async def test_different_merchant_misses():
+    """Identical vectors still miss when the merchant differs."""
+    cache = _cache()
+    await cache.add("Pay $10 for Notion", _vector(1, 0), NOTION)
+
+    assert await cache.lookup("Pay $10 for Figma", _vector(1, 0)) is None
+
+
+async def test_expired_entries_miss(monkeypatch):
+    """Entries older than the TTL are ignored."""
+    cache = _cache(ttl_seconds=60)
+    await cache.add("Pay $10 for Notion", _vector(1, 0), NOTION)
+
+    later = time.time() + 61
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: later)
+
+    assert await cache.lookup("Pay $10 for Notion", _vector(1, 0)) is None
+
+
+async def test_oldest_entry_is_evicted():
+    """Past max_entries the oldest entry goes first."""
+    cache = _cache(max_entries=2)
+    await cache.add("Pay $10 for Notion", _vector(1, 0), NOTION)
+    await cache.add("Pay $20 for Figma", _vector(0, 1), {"merchant": "Figma"})
+    await cache.add("Pay $30 for Slack", _vector(1, 1), {"merchant": "Slack"})
+
+    assert await cache.lookup("Pay $10 for Notion", _vector(1, 0)) is None
+    assert await cache.lookup("Pay $20 for Figma", _vector(0, 1)) == {"merchant": "Figma"}
+    assert await cache.lookup("Pay $30 for Slack", _vector(1, 1)) == {"merchant": "Slack"}
+
+
+async def test_entries_persist(tmp_path):
+    """Entries written to SQLite are loaded by the next cache."""
+    db_path = str(tmp_path / "intents.db")
+    await _cache(db_path=db_path).add("Pay $10 for Notion", _vector(1, 0), NOTION)
+
+    reloaded = _cache(db_path=db_path)
+
+    assert await reloaded.lookup("Pay 10 dollars to Notion", _vector(1, 0)) == NOTION